@@ -13,29 +13,58 @@ import os
 import sys
 import numpy as np
 import ctypes
-import ctypes.util
+import glob
+import importlib
+import io
+import pkgutil
 import struct
 import collections
+import collections.abc
 import locale
+import queue
+import tempfile
+import threading
 import warnings
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 __all__ = ['libtiff', 'TIFF']
 
-cwd = os.getcwd()
-try:
-    try:
-        # Typically, on Windows, the CWD is among the folders searched to locate
-        # a DLL. So change it to the directory containing this module, in case
-        # the libtiff DLL was installed aside it (although that's not typically the case).
-        os.chdir(os.path.dirname(__file__))
-    except FileNotFoundError:
-        # If "frozen" (ie, embedded in an executable), the directory is not real, and chdir fails
-        # => just ignore (and look for the DLL in all the other standard locations)
-        pass
+_module_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load_library():
+    """ Load the libtiff shared library.
+
+    The usual library names are loaded directly, ctypes.util.find_library
+    is only used when they are not found, as it can run external
+    programs. The current directory is not changed.
+    """
+    if os.name == 'nt':
+        names = ('tiff', 'libtiff', 'libtiff3')
+        # the DLL may be installed aside this module
+        candidates = [os.path.join(_module_dir, name + '.dll')
+                      for name in names]
+        candidates = [lib for lib in candidates if os.path.isfile(lib)]
+    elif sys.platform == 'darwin':
+        candidates = ['libtiff.6.dylib', 'libtiff.5.dylib', 'libtiff.dylib']
+        if hasattr(sys, 'frozen'):
+            # py2app support, see Issue 8.
+            candidates.insert(0, os.path.join(_module_dir, '..', 'Frameworks',
+                                              'libtiff.dylib'))
+    else:
+        candidates = ['libtiff.so.6', 'libtiff.so.5', 'libtiff.so']
+    for lib in candidates:
+        try:
+            return ctypes.cdll.LoadLibrary(lib)
+        except OSError:
+            pass
+
+    from ctypes.util import find_library
     if os.name == 'nt':
         # assume that the directory of the libtiff DLL is in PATH.
-        for lib in ('tiff', 'libtiff', 'libtiff3'):
-            lib = ctypes.util.find_library(lib)
+        for lib in names:
+            lib = find_library(lib)
             if lib is not None:
                 break
         else:
@@ -48,28 +77,20 @@ try:
             else:
                 lib = None
     else:
-        if hasattr(sys, 'frozen') and sys.platform == 'darwin' and \
-                os.path.exists('../Frameworks/libtiff.dylib'):
-            # py2app support, see Issue 8.
-            lib = '../Frameworks/libtiff.dylib'
-        else:
-            lib = ctypes.util.find_library('tiff')
+        lib = find_library('tiff')
+    try:
+        if lib is not None:
+            return ctypes.cdll.LoadLibrary(lib)
+        if os.name == 'nt':
+            return ctypes.cdll.LoadLibrary("libtiff.dll")
+    except OSError:
+        pass
+    raise ImportError('Failed to find TIFF library. Make sure that'
+                      ' libtiff is installed and its location is'
+                      ' listed in PATH|LD_LIBRARY_PATH|..')
 
-    libtiff = None if lib is None else ctypes.cdll.LoadLibrary(lib)
-    if libtiff is None:
-        try:
-            if sys.platform == "darwin":
-                libtiff = ctypes.cdll.LoadLibrary("libtiff.dylib")
-            elif "win" in sys.platform:
-                libtiff = ctypes.cdll.LoadLibrary("libtiff.dll")
-            else:
-                libtiff = ctypes.cdll.LoadLibrary("libtiff.so")
-        except OSError:
-            raise ImportError('Failed to find TIFF library. Make sure that'
-                              ' libtiff is installed and its location is'
-                              ' listed in PATH|LD_LIBRARY_PATH|..')
-finally:
-    os.chdir(cwd)
+
+libtiff = _load_library()
 
 libtiff.TIFFGetVersion.restype = ctypes.c_char_p
 libtiff.TIFFGetVersion.argtypes = []
@@ -80,12 +101,6 @@ assert i != -1, repr(libtiff_version_str.decode())
 libtiff_version = libtiff_version_str.split()[i + 1].decode()
 libtiff_version_tuple = tuple(int(i) for i in libtiff_version.split('.'))
 
-tiff_h_name = 'tiff_h_%s' % (libtiff_version.replace('.', '_'))
-try:
-    exec(u"import libtiff.{0:s} as tiff_h".format(tiff_h_name))
-except ImportError:
-    tiff_h = None
-
 
 def _generate_lines_without_continuations(file_obj):
     """Parse lines from tiff.h but concatenate lines using a backslahs for continuation."""
@@ -97,75 +112,110 @@ def _generate_lines_without_continuations(file_obj):
         yield header_line
 
 
-if tiff_h is None:
-    # WARNING: there is not guarantee that the tiff.h found below will
-    # correspond to libtiff version. Although, for clean distros the
-    # probability is high.
-
-    include_tiff_h = os.path.join(os.path.split(lib)[0], '..', 'include',
-                                  'tiff.h')
-    if not os.path.isfile(include_tiff_h):
-        include_tiff_h = os.environ.get('TIFF_HEADER_PATH', include_tiff_h)
-    if not os.path.isfile(include_tiff_h):
-        include_tiff_h = os.path.join(os.path.split(lib)[0], 'include',
-                                      'tiff.h')
-    if not os.path.isfile(include_tiff_h):
-        # fix me for windows:
-        include_tiff_h = os.path.join(sys.prefix, 'include', 'tiff.h')
-        # print(include_tiff_h)
-    if not os.path.isfile(include_tiff_h):
-        import glob
-        include_tiff_h = (glob.glob(os.path.join(sys.prefix, 'include',
-                                                 '*linux*', 'tiff.h')) +
-                          glob.glob(os.path.join(sys.prefix, 'include',
-                                                 '*kfreebsd*', 'tiff.h')) +
-                          [include_tiff_h])[0]
-    if not os.path.isfile(include_tiff_h):
-        # Base it off of the python called
-        include_tiff_h = os.path.realpath(os.path.join(os.path.split(
-            sys.executable)[0], '..', 'include', 'tiff.h'))
-    if not os.path.isfile(include_tiff_h):
-        raise ValueError('Failed to find TIFF header file (may be need to '
-                         'run: sudo apt-get install libtiff5-dev)')
+def _parse_tiff_h(include_tiff_h):
+    """ Return the constants defined in the tiff.h header file.
+    """
     # Read TIFFTAG_* constants for the header file:
-    f = open(include_tiff_h, 'r')
-    lst = []
     d = {}
-    for line in _generate_lines_without_continuations(f):
-        if not line.startswith('#define'):
-            continue
-        words = line[7:].lstrip().split()
-        if len(words) > 2:
-            words[1] = ''.join(words[1:])
-            del words[2:]
-        if len(words) != 2:
-            continue
-        name, value = words
-        if name in ['TIFF_GCC_DEPRECATED', 'TIFF_MSC_DEPRECATED']:
-            continue
-        i = value.find('/*')
-        if i != -1:
-            value = value[:i]
-        if value in d:
-            value = d[value]
-        else:
-            try:
-                value = eval(value)
-            except Exception as msg:
-                print(repr((value, line)), msg)
-                raise
-        d[name] = value
-        lst.append('%s = %s' % (name, value))
-    f.close()
-
-    fn = os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                      tiff_h_name + '.py')
-    print('Generating %r from %r' % (fn, include_tiff_h))
-    f = open(fn, 'w')
-    f.write('\n'.join(lst) + '\n')
-    f.close()
-else:
-    d = tiff_h.__dict__
+    with open(include_tiff_h, 'r') as f:
+        for line in _generate_lines_without_continuations(f):
+            if not line.startswith('#define'):
+                continue
+            words = line[7:].lstrip().split()
+            if len(words) > 2:
+                words[1] = ''.join(words[1:])
+                del words[2:]
+            if len(words) != 2:
+                continue
+            name, value = words
+            if name in ['TIFF_GCC_DEPRECATED', 'TIFF_MSC_DEPRECATED']:
+                continue
+            i = value.find('/*')
+            if i != -1:
+                value = value[:i]
+            if value in d:
+                value = d[value]
+            else:
+                try:
+                    value = eval(value)
+                except Exception as msg:
+                    print(repr((value, line)), msg)
+                    raise
+            d[name] = value
+    return d
+
+
+def _shipped_tiff_h_versions():
+    """ Return the sorted versions of the tiff_h_* modules of this package.
+    """
+    versions = []
+    for module in pkgutil.iter_modules([_module_dir]):
+        parts = module.name.split('_')
+        if module.name.startswith('tiff_h_') and all(
+                part.isdigit() for part in parts[2:]):
+            versions.append(tuple(int(part) for part in parts[2:]))
+    return sorted(versions)
+
+
+def _find_tiff_h(library_path):
+    """ Return the path of the tiff.h header file installed with the
+    library, or None.
+
+    There is no guarantee that the header found corresponds to the
+    version of the library, although it is likely on clean systems.
+    """
+    library_dir = os.path.dirname(library_path or '')
+    candidates = [os.environ.get('TIFF_HEADER_PATH')]
+    if os.path.isabs(library_dir):
+        candidates += [os.path.join(library_dir, '..', 'include', 'tiff.h'),
+                       os.path.join(library_dir, 'include', 'tiff.h')]
+    include_dir = os.path.join(sys.prefix, 'include')
+    candidates.append(os.path.join(include_dir, 'tiff.h'))
+    candidates += glob.glob(os.path.join(include_dir, '*linux*', 'tiff.h'))
+    candidates += glob.glob(os.path.join(include_dir, '*kfreebsd*',
+                                         'tiff.h'))
+    # Base it off of the python called
+    candidates.append(os.path.realpath(os.path.join(
+        os.path.dirname(sys.executable), '..', 'include', 'tiff.h')))
+    for include_tiff_h in candidates:
+        if include_tiff_h and os.path.isfile(include_tiff_h):
+            return include_tiff_h
+    return None
+
+
+def _load_tiff_h(version_tuple, library_path=None):
+    """ Return the constants of tiff.h for the libtiff version_tuple.
+
+    They are read from the tiff_h_<version> module shipped with this
+    package. For other versions, the tiff.h file given by the
+    TIFF_HEADER_PATH environment variable or installed with the library
+    is parsed. Otherwise, the module of the closest version is used (the
+    newest older one if any) with a warning. Nothing is written to disk.
+    """
+    name = 'tiff_h_%s' % '_'.join(str(v) for v in version_tuple)
+    try:
+        return dict(importlib.import_module('libtiff.' + name).__dict__)
+    except ImportError:
+        pass
+    include_tiff_h = _find_tiff_h(library_path)
+    if include_tiff_h is not None:
+        return _parse_tiff_h(include_tiff_h)
+    versions = _shipped_tiff_h_versions()
+    if not versions:
+        raise ImportError('Failed to find TIFF header file (may be need to '
+                          'run: sudo apt-get install libtiff5-dev), set '
+                          'TIFF_HEADER_PATH to the path of tiff.h')
+    older = [v for v in versions if v <= tuple(version_tuple)]
+    closest = older[-1] if older else versions[0]
+    warnings.warn('No tiff.h found for libtiff %s, using the constants of '
+                  'libtiff %s instead; set TIFF_HEADER_PATH to the path of '
+                  'tiff.h' % ('.'.join(str(v) for v in version_tuple),
+                              '.'.join(str(v) for v in closest)))
+    name = 'tiff_h_%s' % '_'.join(str(v) for v in closest)
+    return dict(importlib.import_module('libtiff.' + name).__dict__)
+
+
+d = _load_tiff_h(libtiff_version_tuple, libtiff._name)
 
 TIFFTAG_CZ_LSMINFO = 34412
 d['TIFFTAG_CZ_LSMINFO'] = TIFFTAG_CZ_LSMINFO
@@ -222,7 +272,13 @@ class c_tsize_t(ctypes.c_ssize_t):
     pass
 
 
-class c_toff_t(ctypes.c_int32):
+# file offsets are 64-bit since libtiff 4.0, for BigTIFF files
+if libtiff_version_tuple[0] >= 4:
+    c_toff_t_base = ctypes.c_uint64
+else:
+    c_toff_t_base = ctypes.c_uint32
+
+class c_toff_t(c_toff_t_base):
     pass
 
 
@@ -419,26 +475,62 @@ def _field_info_to_tifftag(field_info):
     return (data_t, convert_c_to_py)
 
 
+def _array_view(pointer, count):
+    """ Return a read-only NumPy view of count items at pointer.
+
+    The view shares the memory owned by libtiff, it is only valid as long
+    as the directory it was read from is the current one.
+    """
+    if not count:
+        return np.empty(0, dtype=pointer._type_)
+    arr = np.ctypeslib.as_array(pointer, shape=(count,))
+    arr.flags.writeable = False
+    return arr
+
+
+def _c_array(value, c_type, length=None):
+    """ Return value as a 1D C contiguous NumPy array of c_type items.
+
+    Like with ctypes arrays, a value shorter than length is zero-padded.
+    NumPy arrays of the right type are used without copy.
+    """
+    arr = np.ascontiguousarray(value, dtype=c_type).reshape(-1)
+    if length is not None and arr.size != length:
+        if arr.size > length:
+            raise ValueError('Expected at most %d values, got %d'
+                             % (length, arr.size))
+        padded = np.zeros(length, dtype=arr.dtype)
+        padded[:arr.size] = arr
+        arr = padded
+    return arr
+
+
+# Classic TIFF files cannot be larger than 4 GiB. Keep some room for the
+# directories and the strip or tile arrays when estimating the size.
+_BIGTIFF_THRESHOLD = 2 ** 32 - 2 ** 25
+
+# Strip and tile offsets and byte counts are 64-bit since libtiff 4.0
+if libtiff_version_tuple[0] >= 4:
+    _strile_ctype = ctypes.c_uint64
+else:
+    _strile_ctype = ctypes.c_uint32
+
 tifftags = {
 
     # TODO:
     # TIFFTAG_DOTRANGE                2      uint16*
-    # TIFFTAG_HALFTONEHINTS           2      uint16*
     # TIFFTAG_PAGENUMBER              2      uint16*
-    # TIFFTAG_YCBCRSUBSAMPLING        2      uint16*
     # TIFFTAG_FAXFILLFUNC             1      TIFFFaxFillFunc* G3/G4
     #                                                         compression
     #                                                         pseudo-tag
     # TIFFTAG_JPEGTABLES              2      u_short*,void**  count & tables
-    # TIFFTAG_TRANSFERFUNCTION        1 or 3 uint16**         1<<BitsPerSample
-    #                                                         entry arrays
     # TIFFTAG_ICCPROFILE              2      uint32*,void**   count,
     #                                                         profile data
 
     # TIFFTAG: type, conversion
     # 3 uint16* for Set, 3 uint16** for Get; size:(1<<BitsPerSample arrays)
-    TIFFTAG_COLORMAP: (ctypes.c_uint16, lambda _d: (
-        _d[0].contents[:], _d[1].contents[:], _d[2].contents[:])),
+    TIFFTAG_COLORMAP: (ctypes.c_uint16, lambda _d: tuple(
+        _array_view(_p, _d[1]) for _p in _d[0])),
     TIFFTAG_ARTIST: (ctypes.c_char_p, lambda _d: _d.value),
     TIFFTAG_COPYRIGHT: (ctypes.c_char_p, lambda _d: _d.value),
     TIFFTAG_DATETIME: (ctypes.c_char_p, lambda _d: _d.value),
@@ -467,13 +559,13 @@ tifftags = {
     TIFFTAG_TILEWIDTH: (ctypes.c_uint32, lambda _d: _d.value),
 
     TIFFTAG_STRIPBYTECOUNTS: (
-        ctypes.POINTER(ctypes.c_uint32), lambda _d: _d.contents),
+        ctypes.POINTER(_strile_ctype), lambda _d: _array_view(*_d)),
     TIFFTAG_STRIPOFFSETS: (
-        ctypes.POINTER(ctypes.c_uint32), lambda _d: _d.contents),
+        ctypes.POINTER(_strile_ctype), lambda _d: _array_view(*_d)),
     TIFFTAG_TILEBYTECOUNTS: (
-        ctypes.POINTER(ctypes.c_uint32), lambda _d: _d.contents),
+        ctypes.POINTER(_strile_ctype), lambda _d: _array_view(*_d)),
     TIFFTAG_TILEOFFSETS: (
-        ctypes.POINTER(ctypes.c_uint32), lambda _d: _d.contents),
+        ctypes.POINTER(_strile_ctype), lambda _d: _array_view(*_d)),
     # Contrarily to the libtiff documentation, in libtiff 4.0, the
     # SubIFD array is always 64-bits
     TIFFTAG_SUBIFD: (
@@ -522,10 +614,76 @@ tifftags = {
     TIFFTAG_WHITEPOINT: (ctypes.c_float * 2, lambda _d: _d.contents[:]),
     TIFFTAG_YCBCRCOEFFICIENTS: (ctypes.c_float * 3, lambda _d: _d.contents[:]),
 
-    TIFFTAG_CZ_LSMINFO: (c_toff_t, lambda _d: _d.value)
+    # two values, passed as two arguments, see _pair_tags
+    TIFFTAG_HALFTONEHINTS: (
+        ctypes.c_uint16, lambda _d: (_d[0].value, _d[1].value)),
+    TIFFTAG_YCBCRSUBSAMPLING: (
+        ctypes.c_uint16, lambda _d: (_d[0].value, _d[1].value)),
+    # 1 or 3 arrays of 1<<BitsPerSample entries
+    TIFFTAG_TRANSFERFUNCTION: (ctypes.c_uint16, lambda _d: tuple(
+        _array_view(_p, _d[1]) for _p in _d[0])),
+
+    # LSM files are classic TIFF files, where this offset is a LONG
+    TIFFTAG_CZ_LSMINFO: (ctypes.c_uint32, lambda _d: _d.value)
     # offset to CZ_LSMINFO record
 }
 
+# Tags whose two values are passed as two arguments to TIFFGetField and
+# TIFFSetField
+_pair_tags = (TIFFTAG_HALFTONEHINTS, TIFFTAG_YCBCRSUBSAMPLING)
+
+
+# Tags that libtiff keeps in fixed fields of its directory structure. The
+# other tags are stored as custom values that libtiff can enumerate, see
+# TIFF.get_all_tags.
+_core_tags = (
+    TIFFTAG_SUBFILETYPE, TIFFTAG_IMAGEWIDTH, TIFFTAG_IMAGELENGTH,
+    TIFFTAG_BITSPERSAMPLE, TIFFTAG_COMPRESSION, TIFFTAG_PHOTOMETRIC,
+    TIFFTAG_THRESHHOLDING, TIFFTAG_FILLORDER, TIFFTAG_ORIENTATION,
+    TIFFTAG_SAMPLESPERPIXEL, TIFFTAG_ROWSPERSTRIP, TIFFTAG_MINSAMPLEVALUE,
+    TIFFTAG_MAXSAMPLEVALUE, TIFFTAG_XRESOLUTION, TIFFTAG_YRESOLUTION,
+    TIFFTAG_PLANARCONFIG, TIFFTAG_XPOSITION, TIFFTAG_YPOSITION,
+    TIFFTAG_RESOLUTIONUNIT, TIFFTAG_STRIPOFFSETS, TIFFTAG_STRIPBYTECOUNTS,
+    TIFFTAG_TILEWIDTH, TIFFTAG_TILELENGTH, TIFFTAG_TILEDEPTH,
+    TIFFTAG_TILEOFFSETS, TIFFTAG_TILEBYTECOUNTS, TIFFTAG_IMAGEDEPTH,
+    TIFFTAG_EXTRASAMPLES, TIFFTAG_SAMPLEFORMAT, TIFFTAG_SMINSAMPLEVALUE,
+    TIFFTAG_SMAXSAMPLEVALUE, TIFFTAG_COLORMAP, TIFFTAG_TRANSFERFUNCTION,
+    TIFFTAG_SUBIFD, TIFFTAG_YCBCRPOSITIONING, TIFFTAG_YCBCRSUBSAMPLING,
+    TIFFTAG_REFERENCEBLACKWHITE, TIFFTAG_HALFTONEHINTS, TIFFTAG_INKNAMES,
+)
+
+# Tags whose values are arrays of one item per strip or tile
+_strile_tags = (
+    TIFFTAG_STRIPOFFSETS, TIFFTAG_STRIPBYTECOUNTS,
+    TIFFTAG_TILEOFFSETS, TIFFTAG_TILEBYTECOUNTS,
+)
+
+# Tags that are only defined when the corresponding codec is used
+_codec_tags = (
+    TIFFTAG_PREDICTOR, TIFFTAG_JPEGQUALITY, TIFFTAG_JPEGCOLORMODE,
+    TIFFTAG_JPEGTABLESMODE, TIFFTAG_FAXMODE, TIFFTAG_GROUP3OPTIONS,
+    TIFFTAG_GROUP4OPTIONS, TIFFTAG_BADFAXLINES, TIFFTAG_CLEANFAXDATA,
+    TIFFTAG_CONSECUTIVEBADFAXLINES,
+)
+
+# Settings of the encoders that are not stored in the file
+_encoder_pseudo_tags = tuple(
+    globals()[name] for name in (
+        'TIFFTAG_ZIPQUALITY', 'TIFFTAG_ZSTD_LEVEL', 'TIFFTAG_LZMAPRESET',
+        'TIFFTAG_WEBP_LEVEL', 'TIFFTAG_WEBP_LOSSLESS',
+        'TIFFTAG_PIXARLOGQUALITY', 'TIFFTAG_PIXARLOGDATAFMT')
+    if name in globals())
+
+# C types of the scalar custom fields, see TIFF._custom_tifftag
+_custom_ttype2ctype = dict(ttype2ctype)
+_custom_ttype2ctype.update({
+    16: ctypes.c_uint64,  # TIFF_LONG8
+    17: ctypes.c_int64,   # TIFF_SLONG8
+    18: ctypes.c_uint64,  # TIFF_IFD8
+})
+# TIFF_IFD fields are read as 64-bit values since libtiff 4.0
+_custom_ttype2ctype[TIFFDataType.TIFF_IFD] = ctypes.c_uint64
+
 
 def debug(func):
     return func
@@ -588,7 +746,7 @@ class TIFF(ctypes.c_void_p):
                 return tagvalue
 
     @classmethod
-    def open(cls, filename, mode='r'):
+    def open(cls, filename, mode='r', size_hint=None):
         """ Open tiff file as TIFF.
 
         Parameters
@@ -598,9 +756,20 @@ class TIFF(ctypes.c_void_p):
         mode: str
           Specifies if the file is to be opened for reading ('r'), writing ('w'),
           or appending ('a'). Optional flags can be passed. See the documentation
-          of TIFFOpen() for the complete list.
+          of TIFFOpen() for the complete list. In particular, 'w8' creates a
+          BigTIFF file, with 64-bit offsets, which is required for files
+          larger than 4 GiB, and 'w4' creates a classic TIFF file.
+        size_hint: int
+          Estimated size in bytes of the file to write. When it is too large
+          for a classic TIFF file and the mode specifies neither '4' nor '8',
+          a BigTIFF file is created. write_image, write_tiles, begin_image
+          and write_pyramid also switch an empty file to BigTIFF when the
+          image does not fit in a classic TIFF file.
         """
         filename = os.fspath(filename)
+        if (size_hint is not None and size_hint > _BIGTIFF_THRESHOLD
+                and 'w' in mode and '4' not in mode and '8' not in mode):
+            mode += '8'
 
         if isinstance(filename, str) and hasattr(libtiff, "TIFFOpenW"):
             # On Windows, the only reliable way to open a file with unicode characters
@@ -622,6 +791,198 @@ class TIFF(ctypes.c_void_p):
             raise TypeError('Failed to open file ' + repr(filename))
         return tiff
 
+    @classmethod
+    def open_bytes(cls, data):
+        """ Open a TIFF image held in memory for reading.
+
+        Parameters
+        ----------
+        data: bytes-like object (bytes, bytearray, memoryview, mmap, ...)
+          The content of the TIFF file. It is read in place, without copy,
+          and must not be modified while the TIFF object is used.
+        """
+        return cls.open_buffer(data, mode='r')
+
+    @classmethod
+    def open_buffer(cls, buffer, mode='r', name='<memory>'):
+        """ Open a TIFF image in a Python buffer or file object.
+
+        Parameters
+        ----------
+        buffer: bytes-like object or binary file object
+          A bytes-like object is read in place. A seekable file object,
+          such as io.BytesIO, is read and written through its methods.
+          The content of an io.BytesIO opened for reading is also read in
+          place, and the io.BytesIO cannot be resized until the TIFF
+          object is closed.
+        mode: str
+          As in TIFF.open. Writing ('w' or 'a') requires a file object,
+          which is truncated in 'w' mode.
+        name: str
+          Name of the file, used in the messages of libtiff and returned
+          by FileName().
+        """
+        return cls._client_open(_TIFFClient(buffer, mode), mode, name)
+
+    @classmethod
+    def _client_open(cls, client, mode, name):
+        """ Open a TIFF with the procedures of the _TIFFClient client.
+        """
+        libtiff.TIFFClientOpen.restype = cls
+        try:
+            tiff = libtiff.TIFFClientOpen(
+                name.encode(), mode.encode('ascii'), None, *client.procs)
+        finally:
+            libtiff.TIFFClientOpen.restype = TIFF
+        if tiff.value is None:
+            raise TypeError('Failed to open buffer ' + repr(name))
+        # the procedures must live as long as the handle
+        tiff._client = client
+        return tiff
+
+    @classmethod
+    def open_append(cls, filename, sidecar=True):
+        """ Open a TIFF file to append pages to it, in a time that does
+        not depend on the number of pages already in the file.
+
+        When a directory is written, libtiff links it to the last one by
+        following the chain of directories from the first one. Here, the
+        chain is followed from the last directory, whose offset is saved
+        in a sidecar file (filename + '.lastifd') when the TIFF is closed.
+        The sidecar is only used when the file size and modification time
+        it records match, and when it points to a valid directory;
+        otherwise the whole chain is followed once.
+
+        The returned TIFF is opened in 'a' mode, and only knows about the
+        last directory of the file.
+
+        Parameters
+        ----------
+        filename: path-like object (str, bytes, or Path)
+          The path to the file, which is created if it does not exist.
+        sidecar: bool
+          Use the sidecar file. Without it, the chain of directories is
+          followed when the file is opened, but the pages written with the
+          returned TIFF are still appended in constant time.
+        """
+        filename = os.fsdecode(os.fspath(filename))
+        sidecar_name = filename + '.lastifd' if sidecar else None
+        exists = os.path.isfile(filename) and os.path.getsize(filename) > 0
+        fileobj = open(filename, 'r+b' if exists else 'w+b')
+        try:
+            last = None
+            header = None
+            if exists:
+                header, order, bigtiff, first = _read_tiff_header(fileobj)
+            if header is not None and first:
+                start = first
+                if sidecar_name is not None:
+                    try:
+                        with open(sidecar_name) as f:
+                            offset, size, mtime = (int(v) for v in
+                                                   f.read().split())
+                        stat = os.fstat(fileobj.fileno())
+                        if (size, mtime) == (stat.st_size, stat.st_mtime_ns):
+                            start = offset
+                    except (OSError, ValueError):
+                        pass
+                try:
+                    last = _last_directory_offset(fileobj, order, bigtiff,
+                                                  start)
+                except (ValueError, struct.error):
+                    if start == first:
+                        raise
+                    last = _last_directory_offset(fileobj, order, bigtiff,
+                                                  first)
+                # libtiff starts the chain from the last directory
+                if bigtiff:
+                    header = header[:8] + struct.pack(order + 'Q', last)
+                else:
+                    header = header[:4] + struct.pack(order + 'I', last)
+
+            def on_close(client):
+                try:
+                    if sidecar_name is None:
+                        return
+                    _, order, bigtiff, first = _read_tiff_header(fileobj)
+                    if not first:
+                        return
+                    offset = _last_directory_offset(fileobj, order, bigtiff,
+                                                    last or first)
+                    fileobj.flush()
+                    stat = os.fstat(fileobj.fileno())
+                    with open(sidecar_name, 'w') as f:
+                        f.write('%d %d %d\n' % (offset, stat.st_size,
+                                                stat.st_mtime_ns))
+                finally:
+                    fileobj.close()
+
+            # libtiff reads the header from the current position
+            fileobj.seek(0)
+            mode = 'a' if exists else 'w'
+            client = _TIFFClient(fileobj, mode)
+            client.header = header
+            client.on_close = on_close
+            return cls._client_open(client, mode, filename)
+        except Exception:
+            fileobj.close()
+            raise
+
+    def _ensure_bigtiff(self, nbytes):
+        """ Make sure that nbytes of image data can be written.
+
+        A classic TIFF file opened for writing, to which nothing has been
+        written yet, is reopened as a BigTIFF file when nbytes would not
+        fit in it. The tags already set are kept. Otherwise, the file is
+        left as it is: compressed data may still fit, and libtiff reports
+        an error if it does not.
+        """
+        if (nbytes <= _BIGTIFF_THRESHOLD or self.GetMode() == os.O_RDONLY
+                or self.IsBigTIFF()):
+            return
+        client = self._client
+        filename = os.fsdecode(self.FileName())
+        if client is not None:
+            if client.size() > 8:
+                return
+        elif not os.path.isfile(filename) or os.path.getsize(filename) > 8:
+            return
+        # The values may point into the directory of the handle that is
+        # closed below: copy them, and convert them before closing so
+        # that a failure leaves the handle untouched.
+        args = []
+        for tag, value in self._get_all_fields().items():
+            if tag in _strile_tags:
+                continue
+            if isinstance(value, np.ndarray):
+                value = np.array(value, copy=True)
+            elif isinstance(value, tuple):
+                value = tuple(np.array(v, copy=True)
+                              if isinstance(v, np.ndarray) else v
+                              for v in value)
+            tag_args = self._set_field_args(tag, value)
+            if tag_args is not None:
+                args.append(tag_args)
+        mode = 'w8'
+        if self.IsByteSwapped():
+            mode += 'b' if sys.byteorder == 'little' else 'l'
+        on_close = None
+        if client is not None:
+            # the file object is still used by the new handle
+            on_close, client.on_close = client.on_close, None
+        libtiff.TIFFClose(self)
+        if client is not None:
+            other = TIFF.open_buffer(client.source, mode, filename)
+            other._client.on_close = on_close
+        else:
+            other = TIFF.open(filename, mode)
+        self._client = other._client
+        self.value, other.value = other.value, None
+        self._dir_offsets = None
+        self._layout = None
+        for tag_args in args:
+            libtiff.TIFFSetField(self, *tag_args)
+
     @staticmethod
     def get_numpy_type(bits, sample_format=None):
         """ Return numpy dtype corresponding to bits and sample format.
@@ -641,59 +1002,201 @@ class TIFF(ctypes.c_void_p):
             raise NotImplementedError(repr(sample_format))
         return typ
 
+    @staticmethod
+    def get_sample_format(dtype):
+        """ Return the sample format corresponding to numpy dtype.
+        """
+        dtype = np.dtype(dtype)
+        if np.issubdtype(dtype, np.floating):
+            return SAMPLEFORMAT_IEEEFP
+        elif np.issubdtype(dtype, np.unsignedinteger) or np.issubdtype(dtype, np.bool_):
+            return SAMPLEFORMAT_UINT
+        elif np.issubdtype(dtype, np.signedinteger):
+            return SAMPLEFORMAT_INT
+        elif np.issubdtype(dtype, np.complexfloating):
+            return SAMPLEFORMAT_COMPLEXIEEEFP
+        raise NotImplementedError(repr(dtype))
+
+    def _reopen(self):
+        """ Open another read-only handle on the same file.
+
+        The new handle is positioned on the current directory. It is used
+        by worker threads, as a libtiff handle cannot be shared between
+        threads.
+        """
+        if self._client is not None:
+            other = TIFF.open_buffer(self._client.source, mode='r',
+                                     name=os.fsdecode(self.FileName()))
+        else:
+            other = TIFF.open(self.FileName(), mode='r')
+        other.SetSubDirectory(self.CurrentDirOffset())
+        return other
+
+    def _can_reopen(self):
+        """ Return whether _reopen can be used, which requires a file
+        opened for reading, or a buffer read in place.
+        """
+        return self.GetMode() == os.O_RDONLY and (
+            self._client is None or self._client.array is not None)
+
+    def _map_workers(self, func, items, workers=None):
+        """ Call func(tiff, item) for all items.
+
+        If workers > 1, the items are split into contiguous chunks that
+        are processed concurrently, each worker thread using its own
+        handle on the file (see _reopen). ctypes releases the GIL
+        while libtiff decodes the data.
+        """
+        items = list(items)
+        if (workers is None or workers <= 1 or len(items) <= 1
+                or not self._can_reopen()):
+            for item in items:
+                func(self, item)
+            return
+        workers = min(workers, len(items))
+
+        def run(chunk):
+            tiff = self._reopen()
+            try:
+                for item in chunk:
+                    func(tiff, item)
+            finally:
+                tiff.close()
+
+        n = len(items)
+        with ThreadPoolExecutor(workers) as executor:
+            futures = [executor.submit(run, items[i * n // workers:
+                                                  (i + 1) * n // workers])
+                       for i in range(workers)]
+            for future in futures:
+                future.result()
+
+    @staticmethod
+    def _output_array(out, shape, dtype):
+        """ Return out, or a new array if out is None.
+
+        The decoders write straight into the memory of the array, so out
+        must have exactly the expected shape and dtype, be C-contiguous
+        and writeable. It can be a numpy.memmap.
+        """
+        shape = tuple(shape)
+        if out is None:
+            return np.empty(shape, dtype)
+        if out.shape != shape or out.dtype != dtype:
+            raise ValueError("out must have shape %r and dtype %s, got %r and %s"
+                             % (shape, np.dtype(dtype), out.shape, out.dtype))
+        if not out.flags.c_contiguous or not out.flags.writeable:
+            raise ValueError("out must be a writeable C-contiguous array")
+        return out
+
     @debug
-    def read_image(self, verbose=False):
-        """ Read image from TIFF and return it as an array. """
-        if self.IsTiled():
-            bits = self.GetField('BitsPerSample')
-            sample_format = self.GetField('SampleFormat')
-            typ = self.get_numpy_type(bits, sample_format)
-            return self.read_tiles(typ)
+    def read_image(self, verbose=False, workers=None, out=None,
+                   use_memmap=False):
+        """ Read image from TIFF and return it as an array.
+
+        Parameters
+        ----------
+        workers: int
+          Number of threads used to decode the strips (or tiles)
+          concurrently. Each thread opens its own handle on the file.
+        out: numpy.ndarray
+          Preallocated array (or numpy.memmap) into which the image is
+          decoded. It must have the shape and dtype of the image and be
+          C-contiguous. It is returned.
+        use_memmap: bool
+          If True and the image is stored uncompressed, in native byte
+          order and in contiguous strips (or full-width tiles), a
+          read-only numpy.memmap of the file is returned instead of a
+          decoded copy. Otherwise, the image is decoded as usual.
+        """
+        layout = self.get_layout()
+        if use_memmap:
+            if out is not None:
+                raise ValueError("use_memmap cannot be used with out")
+            arr = self._memmap_image(layout)
+            if arr is not None:
+                return arr
+        if layout.tiled:
+            return self.read_tiles(layout.dtype, workers=workers, out=out)
         else:
-            width = self.GetField('ImageWidth')
-            height = self.GetField('ImageLength')
-            samples_pp = self.GetField(
-                'SamplesPerPixel')  # this number includes extra samples
-            if samples_pp is None:  # default is 1
-                samples_pp = 1
-            # Note: In the TIFF specification, BitsPerSample and
-            # SampleFormat are per samples. However, libtiff doesn't
-            # support mixed format, so it will always return just one
-            # value (or raise an error).
-            bits = self.GetField('BitsPerSample')
-            sample_format = self.GetField('SampleFormat')
-            planar_config = self.GetField('PlanarConfig')
-            if planar_config is None:  # default is contig
-                planar_config = PLANARCONFIG_CONTIG
-            compression = self.GetField('Compression')
-            if compression is None:  # default is no compression
-                compression = COMPRESSION_NONE
+            samples_pp = layout.samples_per_pixel
+            planar_config = layout.planar_config
             # TODO: rotate according to orientation
 
             # TODO: might need special support if bits < 8
-            typ = self.get_numpy_type(bits, sample_format)
-
-            if samples_pp == 1:
-                # only 2 dimensions array
-                arr = np.empty((height, width), typ)
-            else:
-                if planar_config == PLANARCONFIG_CONTIG:
-                    arr = np.empty((height, width, samples_pp), typ)
-                elif planar_config == PLANARCONFIG_SEPARATE:
-                    arr = np.empty((samples_pp, height, width), typ)
-                else:
-                    raise IOError("Unexpected PlanarConfig = %d"
-                                  % planar_config)
-            size = arr.nbytes
+            arr = self._output_array(out, layout.shape, layout.dtype)
             data = arr.ctypes.data  # Saves a little bit of time in the loop
-            pos = 0
-            for strip in range(self.NumberOfStrips()):
-                elem = self.ReadEncodedStrip(strip, data + pos, max(size - pos, 0))
+            num_strips = self.NumberOfStrips()
+            strip_size = self.StripSize()
+            if planar_config == PLANARCONFIG_SEPARATE:
+                num_planes = samples_pp
+            else:
+                num_planes = 1
+            plane_size = arr.nbytes // num_planes
+            strips_per_plane = num_strips // num_planes
+
+            def read_strip(tiff, strip):
+                plane_index, index = divmod(strip, strips_per_plane)
+                pos = index * strip_size
+                size = min(strip_size, plane_size - pos)
+                pos += plane_index * plane_size
+                elem = tiff.ReadEncodedStrip(strip, data + pos, size)
                 if elem <= 0:
                     raise IOError("Failed to read strip")
-                pos += elem
+
+            self._map_workers(read_strip, range(num_strips), workers)
             return arr
 
+    def _memmap_image(self, layout):
+        """ Return a read-only numpy.memmap of the current image, or None.
+
+        The image can only be mapped when it is uncompressed, in native
+        byte order and its strips (or full-width tiles) follow each other
+        in the file, in the order of the rows.
+        """
+        if (layout.compression != COMPRESSION_NONE or self.IsByteSwapped()
+                or self.GetMode() != os.O_RDONLY):
+            return None
+        if self._client is not None and self._client.array is None:
+            return None
+        if layout.tiled:
+            if layout.tile_width != layout.width or layout.depth != 1:
+                return None
+            chunk_rows = layout.tile_length
+        else:
+            chunk_rows = min(layout.rows_per_strip, layout.length)
+        shape = layout.shape
+        dtype = np.dtype(layout.dtype)
+        if layout.samples_per_pixel > 1 and \
+                layout.planar_config == PLANARCONFIG_SEPARATE:
+            num_planes = layout.samples_per_pixel
+        else:
+            num_planes = 1
+        plane_size = int(np.prod(shape)) * dtype.itemsize // num_planes
+        row_size = plane_size // layout.length
+
+        # libtiff uses the same arrays for strips and tiles
+        offsets = self.GetField(TIFFTAG_STRIPOFFSETS)
+        bytecounts = self.GetField(TIFFTAG_STRIPBYTECOUNTS)
+        chunks_per_plane = -(-layout.length // chunk_rows)
+        if offsets is None or len(offsets) != num_planes * chunks_per_plane:
+            return None
+        plane_index, chunk_index = np.divmod(
+            np.arange(len(offsets), dtype=np.int64), chunks_per_plane)
+        expected = (int(offsets[0]) + plane_index * plane_size
+                    + chunk_index * chunk_rows * row_size)
+        rows = np.minimum(chunk_rows, layout.length - chunk_index * chunk_rows)
+        if (not np.array_equal(offsets, expected)
+                or np.any(bytecounts < rows * row_size)):
+            return None
+        if self._client is not None:
+            # a view of the buffer
+            start = int(offsets[0])
+            stop = start + num_planes * plane_size
+            return self._client.array[start:stop].view(dtype).reshape(shape)
+        return np.memmap(self.FileName(), dtype=dtype, mode='r',
+                         offset=int(offsets[0]), shape=shape)
+
     @staticmethod
     def _fix_compression(_value):
         if isinstance(_value, int):
@@ -706,6 +1209,27 @@ class TIFF(ctypes.c_void_p):
         else:
             raise NotImplementedError(repr(_value))
 
+    def _parallel_encoder(self, workers):
+        """ Return a _ChunkEncoder of the strips (or tiles) of the current
+        directory, whose fields must all be set, to encode them with
+        workers threads, or None when libtiff encodes them in the calling
+        thread.
+
+        JPEG data depends on tables shared by the whole directory, and
+        uncompressed data has nothing to encode: workers is ignored for
+        them, with a warning.
+        """
+        if workers is None or workers <= 1:
+            return None
+        compression = self.GetField(TIFFTAG_COMPRESSION)
+        if compression in (None, COMPRESSION_NONE, COMPRESSION_JPEG,
+                           COMPRESSION_OJPEG):
+            warnings.warn("workers=%d is ignored with compression %s"
+                          % (workers, define_to_name_map['Compression'].get(
+                              compression, compression)))
+            return None
+        return _ChunkEncoder(self)
+
     @staticmethod
     def _fix_sampleformat(_value):
         if isinstance(_value, int):
@@ -719,7 +1243,8 @@ class TIFF(ctypes.c_void_p):
         else:
             raise NotImplementedError(repr(_value))
 
-    def write_image(self, arr, compression=None, write_rgb=False):
+    def write_image(self, arr, compression=None, write_rgb=False,
+                    rows_per_strip=None, strip_bytes=None, workers=None):
         """ Write array as TIFF image.
 
         Parameters
@@ -734,47 +1259,94 @@ class TIFF(ctypes.c_void_p):
         write_rgb: bool
           Write rgb image if data has 3 dimensions (otherwise, writes a
           multipage TIFF).
+        rows_per_strip : int
+          Write the images in strips of this number of rows. By default,
+          each image (or plane) is written as a single strip.
+        strip_bytes : int
+          Write the images in strips of about this number of
+          uncompressed bytes, instead of specifying rows_per_strip.
+        workers : int
+          Compress the strips with this number of threads, see
+          _ChunkEncoder. They are written in order as raw strips. JPEG
+          compression is done by libtiff in the calling thread.
         """
+        if rows_per_strip is not None and strip_bytes is not None:
+            raise ValueError("rows_per_strip and strip_bytes are exclusive")
         compression = self._fix_compression(compression)
 
-        arr = np.ascontiguousarray(arr)
-        if np.issubdtype(arr.dtype, np.floating):
-            sample_format = SAMPLEFORMAT_IEEEFP
-        elif np.issubdtype(arr.dtype, np.unsignedinteger) or np.issubdtype(arr.dtype, np.bool_):
-            sample_format = SAMPLEFORMAT_UINT
-        elif np.issubdtype(arr.dtype, np.signedinteger):
-            sample_format = SAMPLEFORMAT_INT
-        elif np.issubdtype(arr.dtype, np.complexfloating):
-            sample_format = SAMPLEFORMAT_COMPLEXIEEEFP
-        else:
-            raise NotImplementedError(repr(arr.dtype))
+        # the strips are made contiguous one at a time, so that a memory
+        # mapped array is not copied as a whole
+        arr = np.asarray(arr)
+        sample_format = self.get_sample_format(arr.dtype)
+        self._ensure_bigtiff(arr.nbytes)
         shape = arr.shape
         bits = arr.itemsize * 8
 
-        self.SetField(TIFFTAG_COMPRESSION, compression)
-        if compression == COMPRESSION_LZW and sample_format in \
-                [SAMPLEFORMAT_INT, SAMPLEFORMAT_UINT]:
-            # This field can only be set after compression and before
-            # writing data. Horizontal predictor often improves compression,
-            # but some rare readers might support LZW only without predictor.
-            self.SetField(TIFFTAG_PREDICTOR, PREDICTOR_HORIZONTAL)
+        def set_sample_fields():
+            self.SetField(TIFFTAG_COMPRESSION, compression)
+            if compression == COMPRESSION_LZW and sample_format in \
+                    [SAMPLEFORMAT_INT, SAMPLEFORMAT_UINT]:
+                # This field can only be set after compression and before
+                # writing data. Horizontal predictor often improves
+                # compression, but some rare readers might support LZW only
+                # without predictor.
+                self.SetField(TIFFTAG_PREDICTOR, PREDICTOR_HORIZONTAL)
+
+            self.SetField(TIFFTAG_BITSPERSAMPLE, bits)
+            self.SetField(TIFFTAG_SAMPLEFORMAT, sample_format)
+            self.SetField(TIFFTAG_ORIENTATION, ORIENTATION_TOPLEFT)
+
+        def write_strips(plane, plane_index=0):
+            """ Write the plane of shape (height, width[, samples]) as the
+            strips of the plane_index plane.
+            """
+            height = plane.shape[0]
+            if rows_per_strip is not None:
+                rows = rows_per_strip
+            elif strip_bytes is not None:
+                rows = strip_bytes // (plane[:1].nbytes or 1)
+            else:
+                # a single strip, as the rows per strip tag is not set
+                plane = np.ascontiguousarray(plane)
+                self.WriteEncodedStrip(plane_index, plane.ctypes.data,
+                                       plane.nbytes)
+                return
+            rows = max(1, min(rows, height))
+            if plane_index == 0:
+                self.SetField(TIFFTAG_ROWSPERSTRIP, rows)
+            first_strip = plane_index * (-(-height // rows))
+            starts = range(0, height, rows)
+            encoder = self._parallel_encoder(workers)
+            if encoder is None:
+                for index, start in enumerate(starts, first_strip):
+                    strip = np.ascontiguousarray(plane[start:start + rows])
+                    self.WriteEncodedStrip(index, strip.ctypes.data,
+                                           strip.nbytes)
+                return
 
-        self.SetField(TIFFTAG_BITSPERSAMPLE, bits)
-        self.SetField(TIFFTAG_SAMPLEFORMAT, sample_format)
-        self.SetField(TIFFTAG_ORIENTATION, ORIENTATION_TOPLEFT)
+            def encode(start):
+                return encoder(plane[start:start + rows])
+
+            try:
+                for index, data in enumerate(
+                        _ordered_map(encode, starts, workers), first_strip):
+                    self.WriteRawStrip(index, data, len(data))
+            finally:
+                encoder.close()
+
+        set_sample_fields()
 
         if len(shape) == 1:
             shape = (shape[0], 1)  # Same as 2D with height == 1
 
         if len(shape) == 2:
             height, width = shape
-            size = width * height * arr.itemsize
 
             self.SetField(TIFFTAG_IMAGEWIDTH, width)
             self.SetField(TIFFTAG_IMAGELENGTH, height)
             self.SetField(TIFFTAG_PHOTOMETRIC, PHOTOMETRIC_MINISBLACK)
             self.SetField(TIFFTAG_PLANARCONFIG, PLANARCONFIG_CONTIG)
-            self.WriteEncodedStrip(0, arr.ctypes.data, size)
+            write_strips(arr.reshape(shape))
             self.WriteDirectory()
 
         elif len(shape) == 3:
@@ -783,11 +1355,9 @@ class TIFF(ctypes.c_void_p):
                 if shape[2] == 3 or shape[2] == 4:
                     planar_config = PLANARCONFIG_CONTIG
                     height, width, depth = shape
-                    size = arr.nbytes
                 else:
                     planar_config = PLANARCONFIG_SEPARATE
                     depth, height, width = shape
-                    size = width * height * arr.itemsize
 
                 self.SetField(TIFFTAG_PHOTOMETRIC, PHOTOMETRIC_RGB)
                 self.SetField(TIFFTAG_IMAGEWIDTH, width)
@@ -802,41 +1372,232 @@ class TIFF(ctypes.c_void_p):
                                   [EXTRASAMPLE_UNSPECIFIED] * (depth - 3))
 
                 if planar_config == PLANARCONFIG_CONTIG:
-                    self.WriteEncodedStrip(0, arr.ctypes.data, size)
+                    write_strips(arr)
                 else:
                     for _n in range(depth):
-                        self.WriteEncodedStrip(_n, arr[_n, :, :].ctypes.data, size)
+                        write_strips(arr[_n], _n)
                 self.WriteDirectory()
+            elif workers is None or workers <= 1:
+                # the tags of the first page are replayed on the others
+                pages_rows = rows_per_strip
+                if strip_bytes is not None:
+                    pages_rows = max(1, strip_bytes // (arr[0, :1].nbytes
+                                                        or 1))
+                self.write_pages(arr, compression=compression,
+                                 rows_per_strip=pages_rows)
             else:
                 depth, height, width = shape
-                size = width * height * arr.itemsize
                 for _n in range(depth):
+                    if _n:
+                        # WriteDirectory resets the fields
+                        set_sample_fields()
                     self.SetField(TIFFTAG_IMAGEWIDTH, width)
                     self.SetField(TIFFTAG_IMAGELENGTH, height)
                     self.SetField(TIFFTAG_PHOTOMETRIC, PHOTOMETRIC_MINISBLACK)
                     self.SetField(TIFFTAG_PLANARCONFIG, PLANARCONFIG_CONTIG)
 
-                    self.WriteEncodedStrip(0, arr[_n].ctypes.data, size)
+                    write_strips(arr[_n])
                     self.WriteDirectory()
         else:
             raise NotImplementedError(repr(shape))
 
-    def write_tiles(self, arr, tile_width=None, tile_height=None,
-                    compression=None, write_rgb=False):
+    def begin_image(self, shape, dtype, compression=None,
+                    rows_per_strip=None, strip_bytes=None):
+        """ Start writing an image that is given in blocks of rows.
+
+        Parameters
+        ----------
+        shape : (int, int) or (int, int, int)
+          Specify the (height, width) of a grayscale image, or the
+          (height, width, samples) of an rgb image.
+        dtype : :numpy:`dtype`
+          Specify the type of the samples.
+        compression : {None, 'lzw', 'deflate', 'packbits', ...}
+          Specify compression scheme, as in write_image.
+        rows_per_strip : int
+          Write strips of this number of rows.
+        strip_bytes : int
+          Write strips of about this number of uncompressed bytes,
+          instead of specifying rows_per_strip. Defaults to 1 MiB.
+
+        Returns
+        -------
+        writer : TIFFImageWriter
+          Give the rows to writer.write_rows, in order, then call
+          writer.close() to write the directory.
+        """
+        if rows_per_strip is not None and strip_bytes is not None:
+            raise ValueError("rows_per_strip and strip_bytes are exclusive")
+        shape = tuple(shape)
+        if len(shape) not in (2, 3) or (len(shape) == 3 and shape[2] < 3):
+            raise ValueError("Expected a (height, width) or (height, width,"
+                             " samples >= 3) shape, got %r" % (shape,))
+        dtype = np.dtype(dtype)
         compression = self._fix_compression(compression)
+        sample_format = self.get_sample_format(dtype)
+        height, width = shape[:2]
+        if rows_per_strip is None:
+            if strip_bytes is None:
+                strip_bytes = 2 ** 20
+            row_bytes = int(np.prod(shape[1:])) * dtype.itemsize
+            rows_per_strip = strip_bytes // (row_bytes or 1)
+        rows_per_strip = max(1, min(rows_per_strip, height))
+        self._ensure_bigtiff(int(np.prod(shape)) * dtype.itemsize)
 
-        if np.issubdtype(arr.dtype, np.floating):
-            sample_format = SAMPLEFORMAT_IEEEFP
-        elif np.issubdtype(arr.dtype, np.unsignedinteger) or np.issubdtype(arr.dtype, np.bool_):
-            sample_format = SAMPLEFORMAT_UINT
-        elif np.issubdtype(arr.dtype, np.signedinteger):
-            sample_format = SAMPLEFORMAT_INT
-        elif np.issubdtype(arr.dtype, np.complexfloating):
-            sample_format = SAMPLEFORMAT_COMPLEXIEEEFP
+        self.SetField(TIFFTAG_COMPRESSION, compression)
+        if compression == COMPRESSION_LZW and sample_format in \
+                [SAMPLEFORMAT_INT, SAMPLEFORMAT_UINT]:
+            self.SetField(TIFFTAG_PREDICTOR, PREDICTOR_HORIZONTAL)
+        self.SetField(TIFFTAG_BITSPERSAMPLE, dtype.itemsize * 8)
+        self.SetField(TIFFTAG_SAMPLEFORMAT, sample_format)
+        self.SetField(TIFFTAG_ORIENTATION, ORIENTATION_TOPLEFT)
+        self.SetField(TIFFTAG_IMAGEWIDTH, width)
+        self.SetField(TIFFTAG_IMAGELENGTH, height)
+        self.SetField(TIFFTAG_ROWSPERSTRIP, rows_per_strip)
+        self.SetField(TIFFTAG_PLANARCONFIG, PLANARCONFIG_CONTIG)
+        if len(shape) == 2:
+            self.SetField(TIFFTAG_PHOTOMETRIC, PHOTOMETRIC_MINISBLACK)
         else:
-            raise NotImplementedError(repr(arr.dtype))
+            depth = shape[2]
+            self.SetField(TIFFTAG_PHOTOMETRIC, PHOTOMETRIC_RGB)
+            self.SetField(TIFFTAG_SAMPLESPERPIXEL, depth)
+            if depth == 4:  # RGBA
+                self.SetField(TIFFTAG_EXTRASAMPLES, [EXTRASAMPLE_UNASSALPHA])
+            elif depth > 4:  # No idea...
+                self.SetField(TIFFTAG_EXTRASAMPLES,
+                              [EXTRASAMPLE_UNSPECIFIED] * (depth - 3))
+        return TIFFImageWriter(self, shape, dtype, rows_per_strip)
+
+    def write_pages(self, pages, template=None, compression=None,
+                    rows_per_strip=None):
+        """ Write a sequence of images of the same shape as pages.
+
+        The tags of the pages are converted once, when the first page is
+        written. The following pages are written with TIFFSetField calls
+        replaying these arguments, followed by their strips and
+        TIFFWriteDirectory, which keeps the work done per page in Python
+        small.
+
+        Parameters
+        ----------
+        pages : iterable of :numpy:`ndarray`
+          Specify images of shape (height, width), or (height, width,
+          samples) for rgb images, and of the same dtype. They can be
+          produced while the pages are written. The file is switched to
+          BigTIFF, as in write_image, when the pages would not fit in a
+          classic TIFF file; for an iterator of unknown length only the
+          first page is counted, use the size_hint argument of open then.
+        template : dict
+          Specify other tags set on every page, as {tag: value}, where
+          tag is a name or a TIFFTAG_* value, as in SetField.
+        compression : {None, 'lzw', 'deflate', 'packbits', ...}
+          Specify compression scheme, as in write_image.
+        rows_per_strip : int
+          Write the pages in strips of this number of rows. By default,
+          each page is written as a single strip.
+
+        Returns
+        -------
+        count : int
+          The number of pages written.
+        """
+        compression = self._fix_compression(compression)
+        tag_args = None
+        count = 0
+        try:
+            for page in pages:
+                page = np.ascontiguousarray(page)
+                if tag_args is None:
+                    shape, dtype = page.shape, page.dtype
+                    if (len(shape) not in (2, 3)
+                            or (len(shape) == 3 and shape[2] < 3)):
+                        raise ValueError("Expected pages of shape (height, "
+                                         "width) or (height, width, samples "
+                                         ">= 3), got %r" % (shape,))
+                    sample_format = self.get_sample_format(dtype)
+                    if isinstance(pages, collections.abc.Sized):
+                        self._ensure_bigtiff(page.nbytes * len(pages))
+                    else:
+                        self._ensure_bigtiff(page.nbytes)
+                    height, width = shape[:2]
+                    rows = max(1, min(rows_per_strip or height, height))
+                    tags = [(TIFFTAG_COMPRESSION, compression)]
+                    if compression == COMPRESSION_LZW and sample_format in \
+                            [SAMPLEFORMAT_INT, SAMPLEFORMAT_UINT]:
+                        tags.append((TIFFTAG_PREDICTOR, PREDICTOR_HORIZONTAL))
+                    tags += [(TIFFTAG_BITSPERSAMPLE, dtype.itemsize * 8),
+                             (TIFFTAG_SAMPLEFORMAT, sample_format),
+                             (TIFFTAG_ORIENTATION, ORIENTATION_TOPLEFT),
+                             (TIFFTAG_IMAGEWIDTH, width),
+                             (TIFFTAG_IMAGELENGTH, height),
+                             (TIFFTAG_PLANARCONFIG, PLANARCONFIG_CONTIG)]
+                    if rows_per_strip is not None:
+                        tags.append((TIFFTAG_ROWSPERSTRIP, rows))
+                    if len(shape) == 2:
+                        tags.append((TIFFTAG_PHOTOMETRIC,
+                                     PHOTOMETRIC_MINISBLACK))
+                    else:
+                        depth = shape[2]
+                        tags += [(TIFFTAG_PHOTOMETRIC, PHOTOMETRIC_RGB),
+                                 (TIFFTAG_SAMPLESPERPIXEL, depth)]
+                        if depth == 4:  # RGBA
+                            tags.append((TIFFTAG_EXTRASAMPLES,
+                                         [EXTRASAMPLE_UNASSALPHA]))
+                        elif depth > 4:  # No idea...
+                            tags.append((TIFFTAG_EXTRASAMPLES,
+                                         [EXTRASAMPLE_UNSPECIFIED]
+                                         * (depth - 3)))
+                    tags += list((template or {}).items())
+                    # the tags are set once to convert them in order, as some
+                    # conversions depend on the tags already set
+                    tag_args = []
+                    for tag, value in tags:
+                        args = self._set_field_args(tag, value)
+                        if args is not None:
+                            libtiff.TIFFSetField(self, *args)
+                            tag_args.append(args)
+                    row_bytes = page[:1].nbytes
+                else:
+                    if page.shape != shape or page.dtype != dtype:
+                        raise ValueError(
+                            "Expected pages of shape %r and dtype %s, got %r "
+                            "and %s" % (shape, dtype, page.shape, page.dtype))
+                    for args in tag_args:
+                        libtiff.TIFFSetField(self, *args)
+                address = page.ctypes.data
+                for index, start in enumerate(range(0, height, rows)):
+                    size = min(rows, height - start) * row_bytes
+                    self.WriteEncodedStrip(index, address + start * row_bytes,
+                                           size)
+                if libtiff.TIFFWriteDirectory(self) != 1:
+                    raise IOError("Failed to write the directory of page %d"
+                                  % count)
+                count += 1
+        finally:
+            # the tags are set without SetField, which resets the layout
+            self._dir_offsets = None
+            self._layout = None
+        return count
+
+    def write_tiles(self, arr, tile_width=None, tile_height=None,
+                    compression=None, write_rgb=False, workers=None):
+        """ Write array as a tiled TIFF image.
+
+        Tiles spanning the whole width of a C-contiguous plane are passed
+        to libtiff as they are; other tiles are copied into a tile buffer,
+        of which only the part outside of the image is zero filled.
+
+        With workers > 1, the tiles are compressed by that number of
+        threads (see _ChunkEncoder) and written in order as raw tiles.
+        JPEG compression is done by libtiff in the calling thread. Whether
+        the threads are faster depends on the number of CPUs available.
+        """
+        compression = self._fix_compression(compression)
+
+        sample_format = self.get_sample_format(arr.dtype)
         shape = arr.shape
         bits = arr.itemsize * 8
+        self._ensure_bigtiff(int(np.prod(shape)) * arr.itemsize)
 
         # if the dimensions are not set, get the values from the tags
         if not tile_width:
@@ -869,26 +1630,62 @@ class TIFF(ctypes.c_void_p):
                         plane_index=0, depth_index=0):
             """ Write all tiles of one plane
             """
-            written_bytes = 0
             tile_arr = np.ascontiguousarray(tile_arr)
-            # Rows
-            for y in range(0, height, tile_height):
-                # Cols
-                for x in range(0, width, tile_width):
-                    # If we are over the edge of the image, use 0 as fill
-                    tile_arr[:] = 0
-
-                    # if the tile is on the edge, it is smaller
-                    this_tile_width = min(tile_width, width - x)
-                    this_tile_height = min(tile_height, height - y)
-
-                    tile_arr[:this_tile_height, :this_tile_width] = \
-                        arr[y:y + this_tile_height, x:x + this_tile_width]
+            # libtiff swaps the bytes of the data in place
+            copy_tiles = bool(self.IsByteSwapped()) and tile_arr.itemsize > 1
+            # the fields of the directory are all set by now
+            encoder = self._parallel_encoder(workers)
+
+            def tiles():
+                # Rows
+                for y in range(0, height, tile_height):
+                    # Cols
+                    for x in range(0, width, tile_width):
+                        # if the tile is on the edge, it is smaller
+                        this_tile_width = min(tile_width, width - x)
+                        this_tile_height = min(tile_height, height - y)
+                        data = arr[y:y + this_tile_height,
+                                   x:x + this_tile_width]
+                        if (data.shape == tile_arr.shape and not copy_tiles
+                                and data.flags.c_contiguous):
+                            # full width tile, used as it is
+                            yield x, y, data
+                            continue
+                        if encoder is None:
+                            tile = tile_arr
+                        else:
+                            # the tiles are compressed concurrently
+                            tile = np.empty_like(tile_arr)
+                        if (this_tile_width < tile_width
+                                or this_tile_height < tile_height):
+                            # If we are over the edge of the image, use 0
+                            # as fill
+                            tile[this_tile_height:] = 0
+                            tile[:this_tile_height, this_tile_width:] = 0
+                        tile[:this_tile_height, :this_tile_width] = data
+                        yield x, y, tile
 
-                    r = self.WriteTile(tile_arr.ctypes.data, x, y,
+            written_bytes = 0
+            if encoder is None:
+                for x, y, tile in tiles():
+                    r = self.WriteTile(tile.ctypes.data, x, y,
                                        depth_index, plane_index)
                     written_bytes += r.value
+                return written_bytes
+
+            def encode(item):
+                x, y, tile = item
+                return x, y, tile.nbytes, encoder(tile)
 
+            try:
+                for x, y, size, data in _ordered_map(encode, tiles(),
+                                                     workers):
+                    tile_index = libtiff.TIFFComputeTile(
+                        self, x, y, depth_index, plane_index).value
+                    self.WriteRawTile(tile_index, data, len(data))
+                    written_bytes += size
+            finally:
+                encoder.close()
             return written_bytes
 
         if len(shape) == 2:
@@ -966,6 +1763,91 @@ class TIFF(ctypes.c_void_p):
 
         return total_written_bytes
 
+    def write_pyramid(self, source, levels=None, tile_size=256,
+                      compression=None, method='mean', shape=None,
+                      dtype=None):
+        """ Write a tiled image and its reduced-resolution levels.
+
+        The full resolution image is written with write_tiles, followed
+        by levels images downsampled by 2 in each direction, written as
+        its SubIFDs (see TIFF.levels). The image is processed one band of
+        tile rows at a time and every band is downsampled as it is
+        written, the reduced levels being kept in temporary memory mapped
+        files until they are written. Hence, the pyramid never has to fit
+        in memory.
+
+        Parameters
+        ----------
+        source: numpy.ndarray or callable
+          The (height, width) or (height, width, 3 or 4 samples) image,
+          or a function read_rows(start, stop) returning its rows
+          [start, stop), such as TIFF.read_rows. With a function, the
+          shape and dtype of the image must be given.
+        levels: int
+          Number of reduced levels. By default, the image is reduced
+          until it fits in one tile.
+        tile_size: int or (int, int)
+          (width, length) of the tiles, multiples of 16.
+        compression: str
+          See write_tiles.
+        method: {'mean', 'nearest', 'mode'}
+          How the 2x2 blocks of pixels are reduced. 'mode' keeps the most
+          frequent value, which suits label images.
+        """
+        if callable(source):
+            if shape is None or dtype is None:
+                raise ValueError("shape and dtype are required with a "
+                                 "read_rows function")
+            read_rows = source
+            shape = tuple(shape)
+            dtype = np.dtype(dtype)
+        else:
+            source = np.asarray(source)
+            shape = source.shape
+            dtype = source.dtype
+            read_rows = _rows_reader(source)
+        if not (len(shape) == 2 or (len(shape) == 3 and shape[2] in (3, 4))):
+            raise ValueError("Unsupported image shape %s" % (shape,))
+        downsample = _downsample_methods.get(method)
+        if downsample is None:
+            raise ValueError("Unknown downsampling method %r" % (method,))
+        if isinstance(tile_size, int):
+            tile_size = (tile_size, tile_size)
+        tile_width, tile_height = tile_size
+
+        shapes = [shape]
+        while True:
+            height, width = shapes[-1][:2]
+            if levels is None:
+                if height <= tile_height and width <= tile_width:
+                    break
+            elif len(shapes) > levels:
+                break
+            shapes.append(((height + 1) // 2, (width + 1) // 2) + shape[2:])
+        self._ensure_bigtiff(sum(int(np.prod(level_shape))
+                                 for level_shape in shapes) * dtype.itemsize)
+        if len(shapes) > 1:
+            self.SetField(TIFFTAG_SUBIFD, [0] * (len(shapes) - 1))
+
+        total_written_bytes = 0
+        for level, level_shape in enumerate(shapes):
+            if level + 1 < len(shapes):
+                # the next level is filled while this one is written
+                reduced = np.memmap(tempfile.TemporaryFile(), dtype, 'w+',
+                                    shape=shapes[level + 1])
+            else:
+                reduced = None
+            if level:
+                self.SetField(TIFFTAG_SUBFILETYPE, FILETYPE_REDUCEDIMAGE)
+            bands = _PyramidLevel(read_rows, level_shape, dtype, tile_height,
+                                  reduced, downsample)
+            total_written_bytes += self.write_tiles(
+                bands, tile_width, tile_height, compression,
+                write_rgb=len(shape) == 3)
+            if reduced is not None:
+                read_rows = _rows_reader(reduced)
+        return total_written_bytes
+
     def read_one_tile(self, x, y):
         """Reads one tile from the TIFF image
 
@@ -991,33 +1873,23 @@ class TIFF(ctypes.c_void_p):
             dimensions will be (sample_index, x, y).
         """
 
-        num_tcols = self.GetField("TileWidth")
+        layout = self.get_layout()
+        num_tcols = layout.tile_width
         if num_tcols is None:
             raise ValueError("TIFFTAG_TILEWIDTH must be set to read tiles")
-        num_trows = self.GetField("TileLength")
+        num_trows = layout.tile_length
         if num_trows is None:
             num_trows = 1
-        num_irows = self.GetField("ImageLength")
-        if num_irows is None:
-            num_irows = 1
-        num_icols = self.GetField("ImageWidth")
+        num_irows = layout.length
+        num_icols = layout.width
         if num_icols is None:
             raise ValueError("TIFFTAG_IMAGEWIDTH must be set to read tiles")
-        # this number includes extra samples
-        samples_pp = self.GetField('SamplesPerPixel')
-        if samples_pp is None:  # default is 1
-            samples_pp = 1
-        planar_config = self.GetField('PlanarConfig')
-        if planar_config is None:  # default is contig
-            planar_config = PLANARCONFIG_CONTIG
-        num_idepth = self.GetField("ImageDepth")
-        if num_idepth is None:
-            num_idepth = 1
-        bits = self.GetField('BitsPerSample')
-        sample_format = self.GetField('SampleFormat')
+        samples_pp = layout.samples_per_pixel
+        planar_config = layout.planar_config
+        num_idepth = layout.depth
 
         # TODO: might need special support if bits < 8
-        dtype = self.get_numpy_type(bits, sample_format)
+        dtype = layout.dtype
 
         if y < 0 or y >= num_irows:
             raise ValueError("Invalid y value")
@@ -1110,96 +1982,486 @@ class TIFF(ctypes.c_void_p):
 
         return tile
 
-    def read_tiles(self, dtype=np.uint8):
-        num_tcols = self.GetField("TileWidth")
+    def read_tiles(self, dtype=np.uint8, workers=None, out=None):
+        """ Read all the tiles of the image and return it as an array.
+
+        Parameters
+        ----------
+        dtype: numpy.dtype
+          Type of the returned array.
+        workers: int
+          Number of threads used to decode the tiles concurrently. Each
+          thread opens its own handle on the file.
+        out: numpy.ndarray
+          Preallocated C-contiguous array into which the image is decoded.
+        """
+        layout = self.get_layout()
+        num_tcols = layout.tile_width
         if num_tcols is None:
             raise ValueError("TIFFTAG_TILEWIDTH must be set to read tiles")
-        num_trows = self.GetField("TileLength")
+        num_trows = layout.tile_length
         if num_trows is None:
             raise ValueError("TIFFTAG_TILELENGTH must be set to read tiles")
-        num_icols = self.GetField("ImageWidth")
+        num_icols = layout.width
         if num_icols is None:
             raise ValueError("TIFFTAG_IMAGEWIDTH must be set to read tiles")
-        num_irows = self.GetField("ImageLength")
-        if num_irows is None:
-            num_irows = 1
-        num_depths = self.GetField("ImageDepth")
-        if num_depths is None:
-            num_depths = 1
-        # this number includes extra samples
-        samples_pp = self.GetField('SamplesPerPixel')
-        if samples_pp is None:  # default is 1
-            samples_pp = 1
-        planar_config = self.GetField('PlanarConfig')
-        if planar_config is None:  # default is contig
-            planar_config = PLANARCONFIG_CONTIG
-
-        def read_plane(plane, tmp_tile, plane_index=0, depth_index=0):
-            for y in range(0, num_irows, num_trows):
-                for x in range(0, num_icols, num_tcols):
-                    r = self.ReadTile(tmp_tile.ctypes.data, x, y,
-                                      depth_index, plane_index)
-                    if not r:
-                        raise ValueError(
-                            "Could not read tile x:%d,y:%d,z:%d,sample:%d"
-                            " from file" %
-                            (x, y, plane_index, depth_index))
-
-                    # if the tile is on the edge, it is smaller
-                    tile_width = min(num_tcols, num_icols - x)
-                    tile_height = min(num_trows, num_irows - y)
-
-                    plane[y:y + tile_height, x:x + tile_width] = \
-                        tmp_tile[:tile_height, :tile_width]
+        num_irows = layout.length
+        num_depths = layout.depth
+        samples_pp = layout.samples_per_pixel
+        planar_config = layout.planar_config
 
+        def read_tile_row(tiff, item):
+            """ Read one row of tiles of one plane
+            """
+            plane, tile_shape, plane_index, depth_index, y = item
+            if (num_tcols == num_icols and y + num_trows <= num_irows
+                    and plane.flags.c_contiguous):
+                # The tile covers whole rows of the plane, so its layout
+                # matches the destination: decode it in place instead of
+                # going through a scratch buffer. Only the ragged tile at
+                # the bottom edge needs the scratch buffer.
+                r = tiff.ReadTile(plane[y:].ctypes.data, 0, y,
+                                  depth_index, plane_index)
+                if r.value < 0:
+                    raise ValueError(
+                        "Could not read tile x:%d,y:%d,z:%d,sample:%d"
+                        " from file" %
+                        (0, y, plane_index, depth_index))
+                return
+            tmp_tile = np.empty(tile_shape, dtype=dtype, order='C')
+            for x in range(0, num_icols, num_tcols):
+                r = tiff.ReadTile(tmp_tile.ctypes.data, x, y,
+                                  depth_index, plane_index)
+                if not r:
+                    raise ValueError(
+                        "Could not read tile x:%d,y:%d,z:%d,sample:%d"
+                        " from file" %
+                        (x, y, plane_index, depth_index))
+
+                # if the tile is on the edge, it is smaller
+                tile_width = min(num_tcols, num_icols - x)
+                tile_height = min(num_trows, num_irows - y)
+
+                plane[y:y + tile_height, x:x + tile_width] = \
+                    tmp_tile[:tile_height, :tile_width]
+
+        def plane_rows(plane, tile_shape, plane_index=0, depth_index=0):
+            return [(plane, tile_shape, plane_index, depth_index, y)
+                    for y in range(0, num_irows, num_trows)]
+
+        tile_rows = []
         if samples_pp == 1:
             if num_depths == 1:
                 # if there's only one sample per pixel there is only
                 # one plane
-                full_image = np.empty((num_irows, num_icols),
-                                      dtype=dtype, order='C')
-                tmp_tile = np.empty((num_trows, num_tcols),
-                                    dtype=dtype, order='C')
-                read_plane(full_image, tmp_tile)
+                full_image = self._output_array(
+                    out, (num_irows, num_icols), dtype)
+                tile_rows += plane_rows(full_image, (num_trows, num_tcols))
             else:
-                full_image = np.empty((num_depths, num_irows, num_icols),
-                                      dtype=dtype, order='C')
-                tmp_tile = np.empty((num_trows, num_tcols),
-                                    dtype=dtype, order='C')
+                full_image = self._output_array(
+                    out, (num_depths, num_irows, num_icols), dtype)
                 for depth_index in range(num_depths):
-                    read_plane(full_image[depth_index], tmp_tile, 0,
-                               depth_index)
+                    tile_rows += plane_rows(full_image[depth_index],
+                                            (num_trows, num_tcols),
+                                            0, depth_index)
         else:
             if planar_config == PLANARCONFIG_CONTIG:
                 # if there is more than one sample per pixel and it's
                 # contiguous in memory, there is only one plane
-                full_image = np.empty((num_irows, num_icols, samples_pp),
-                                      dtype=dtype, order='C')
-                tmp_tile = np.empty((num_trows, num_tcols, samples_pp),
-                                    dtype=dtype, order='C')
-                read_plane(full_image, tmp_tile)
+                full_image = self._output_array(
+                    out, (num_irows, num_icols, samples_pp), dtype)
+                tile_rows += plane_rows(full_image,
+                                        (num_trows, num_tcols, samples_pp))
             elif planar_config == PLANARCONFIG_SEPARATE:
                 # multiple samples per pixel, each sample in one plane
-                full_image = np.empty((samples_pp, num_irows, num_icols),
-                                      dtype=dtype, order='C')
-                tmp_tile = np.empty((num_trows, num_tcols),
-                                    dtype=dtype, order='C')
+                full_image = self._output_array(
+                    out, (samples_pp, num_irows, num_icols), dtype)
                 for plane_index in range(samples_pp):
-                    read_plane(full_image[plane_index], tmp_tile, plane_index)
+                    tile_rows += plane_rows(full_image[plane_index],
+                                            (num_trows, num_tcols),
+                                            plane_index)
             else:
                 raise IOError("Unexpected PlanarConfig = %d" % planar_config)
 
+        self._map_workers(read_tile_row, tile_rows, workers)
         return full_image
 
-    def iter_images(self, verbose=False):
+    def read_region(self, x, y, width, height):
+        """Read a rectangular region from a TIFF image.
+
+        Only the tiles (or strips) that intersect the region are decoded.
+
+        Parameters
+        ----------
+        x: int
+            X coordinate of the upper left pixel of the region
+        y: int
+            Y coordinate of the upper left pixel of the region
+        width: int
+            Width of the region in pixels
+        height: int
+            Height of the region in pixels
+
+        Returns
+        -------
+        numpy.array
+            The dimensions follow the conventions of read_tiles: (height,
+            width) for one sample per pixel, (height, width, sample_index)
+            for PLANARCONFIG_CONTIG, (sample_index, height, width) for
+            PLANARCONFIG_SEPARATE and (depth_index, height, width) if
+            ImageDepth > 1.
+        """
+        layout = self.get_layout()
+        num_tcols = layout.tile_width
+        num_trows = layout.tile_length
+        num_icols = layout.width
+        num_irows = layout.length
+        num_depths = layout.depth
+        samples_pp = layout.samples_per_pixel
+        planar_config = layout.planar_config
+        dtype = layout.dtype
+
+        if width <= 0 or height <= 0:
+            raise ValueError("Invalid region size")
+        if x < 0 or x + width > num_icols:
+            raise ValueError("Invalid x value")
+        if y < 0 or y + height > num_irows:
+            raise ValueError("Invalid y value")
+        x_end = x + width
+        y_end = y + height
+
+        if not layout.tiled:
+            rows = self.read_rows(y, y_end)
+            if samples_pp > 1 and planar_config == PLANARCONFIG_SEPARATE:
+                return np.ascontiguousarray(rows[:, :, x:x_end])
+            return np.ascontiguousarray(rows[:, x:x_end])
+
+        def read_plane(plane, tmp_tile, plane_index=0, depth_index=0):
+            # only visit the tiles that intersect the region
+            for ty in range(y - y % num_trows, y_end, num_trows):
+                for tx in range(x - x % num_tcols, x_end, num_tcols):
+                    r = self.ReadTile(tmp_tile.ctypes.data, tx, ty,
+                                      depth_index, plane_index)
+                    if r.value < 0:
+                        raise ValueError(
+                            "Could not read tile x:%d,y:%d,z:%d,sample:%d"
+                            " from file" %
+                            (tx, ty, depth_index, plane_index))
+                    x0 = max(tx, x)
+                    x1 = min(tx + num_tcols, x_end)
+                    y0 = max(ty, y)
+                    y1 = min(ty + num_trows, y_end)
+                    plane[y0 - y:y1 - y, x0 - x:x1 - x] = \
+                        tmp_tile[y0 - ty:y1 - ty, x0 - tx:x1 - tx]
+
+        if samples_pp == 1:
+            tmp_tile = np.empty((num_trows, num_tcols), dtype=dtype)
+            if num_depths == 1:
+                region = np.empty((height, width), dtype=dtype)
+                read_plane(region, tmp_tile)
+            else:
+                region = np.empty((num_depths, height, width), dtype=dtype)
+                for depth_index in range(num_depths):
+                    read_plane(region[depth_index], tmp_tile, 0, depth_index)
+        elif planar_config == PLANARCONFIG_CONTIG:
+            tmp_tile = np.empty((num_trows, num_tcols, samples_pp),
+                                dtype=dtype)
+            region = np.empty((height, width, samples_pp), dtype=dtype)
+            read_plane(region, tmp_tile)
+        elif planar_config == PLANARCONFIG_SEPARATE:
+            tmp_tile = np.empty((num_trows, num_tcols), dtype=dtype)
+            region = np.empty((samples_pp, height, width), dtype=dtype)
+            for plane_index in range(samples_pp):
+                read_plane(region[plane_index], tmp_tile, plane_index)
+        else:
+            raise IOError("Unexpected PlanarConfig = %d" % planar_config)
+
+        return region
+
+    def read_rows(self, start, stop, out=None):
+        """Read the rows [start, stop) from a stripped TIFF image.
+
+        Only the strips that contain these rows are decoded. The strips
+        that are entirely in the range are decoded directly in the
+        returned array.
+
+        Parameters
+        ----------
+        start: int
+            Index of the first row to read
+        stop: int
+            Index after the last row to read
+        out: numpy.ndarray
+            Preallocated array into which the rows are decoded, see
+            read_image.
+
+        Returns
+        -------
+        numpy.array
+            The dimensions follow the conventions of read_image, with
+            stop - start rows.
+        """
+        layout = self.get_layout()
+        if layout.tiled:
+            raise ValueError("read_rows requires a stripped image")
+        num_irows = layout.length
+        if not 0 <= start < stop <= num_irows:
+            raise ValueError("Invalid row range")
+        rows_per_strip = min(layout.rows_per_strip, num_irows)
+        samples_pp = layout.samples_per_pixel
+        dtype = layout.dtype
+
+        shape = list(layout.shape)
+        if samples_pp > 1 and layout.planar_config == PLANARCONFIG_SEPARATE:
+            arr = self._output_array(out, (samples_pp, stop - start)
+                                     + tuple(shape[2:]), dtype)
+            planes = arr
+            strip_shape = [rows_per_strip] + shape[2:]
+        else:
+            shape[0] = stop - start
+            arr = self._output_array(out, tuple(shape), dtype)
+            planes = [arr]
+            strip_shape = [rows_per_strip] + shape[1:]
+        strips_per_plane = -(-num_irows // rows_per_strip)
+        tmp_strip = None
+
+        for plane_index, plane in enumerate(planes):
+            for index in range(start // rows_per_strip,
+                               (stop - 1) // rows_per_strip + 1):
+                strip = plane_index * strips_per_plane + index
+                y0 = index * rows_per_strip
+                y1 = min(y0 + rows_per_strip, num_irows)
+                partial = y0 < start or y1 > stop
+                if not partial:
+                    buf = plane[y0 - start:y1 - start]
+                else:
+                    if tmp_strip is None:
+                        tmp_strip = np.empty(strip_shape, dtype=dtype)
+                    buf = tmp_strip[:y1 - y0]
+                elem = self.ReadEncodedStrip(strip, buf.ctypes.data,
+                                             buf.nbytes)
+                if elem <= 0:
+                    raise IOError("Failed to read strip")
+                if partial:
+                    r0 = max(y0, start)
+                    r1 = min(y1, stop)
+                    plane[r0 - start:r1 - start] = buf[r0 - y0:r1 - y0]
+        return arr
+
+    def iter_images(self, verbose=False, out=None, reuse=False,
+                    prefetch=None):
         """ Iterator of all images in a TIFF file.
+
+        Parameters
+        ----------
+        out: numpy.ndarray
+          Preallocated array into which every image is decoded, see
+          read_image. The same array is yielded for every directory.
+        reuse: bool
+          If True, the array allocated for the first image is reused for
+          the following ones, as long as they have the same shape and
+          dtype. The yielded array is only valid until the next iteration.
+        prefetch: int
+          Number of directories decoded ahead by a background thread,
+          using its own handle on the file, while the current image is
+          processed. It cannot be combined with out or reuse.
         """
-        yield self.read_image(verbose=verbose)
+        if prefetch:
+            if out is not None or reuse:
+                raise ValueError("prefetch cannot be used with out or reuse")
+            if self._can_reopen():
+                yield from self._iter_images_prefetch(verbose, prefetch)
+                return
+        arr = self.read_image(verbose=verbose, out=out)
+        yield arr
         while not self.LastDirectory():
             self.ReadDirectory()
-            yield self.read_image(verbose=verbose)
+            if reuse:
+                layout = self.get_layout()
+                if arr.shape != layout.shape or arr.dtype != layout.dtype:
+                    # the layout changed, fall back to a new array
+                    arr = None
+                arr = self.read_image(verbose=verbose, out=arr)
+            else:
+                arr = self.read_image(verbose=verbose, out=out)
+            yield arr
         self.SetDirectory(0)
 
+    def _iter_images_prefetch(self, verbose, prefetch):
+        """ Implementation of iter_images with a decoding thread.
+
+        The current directory of self follows the yielded images, so that
+        the tags of the image can be read while it is processed.
+        """
+        results = queue.Queue(prefetch)
+        stopped = threading.Event()
+        tiff = self._reopen()
+
+        def produce():
+            try:
+                while not stopped.is_set():
+                    results.put(tiff.read_image(verbose=verbose))
+                    if tiff.LastDirectory():
+                        break
+                    tiff.ReadDirectory()
+                results.put(None)
+            except Exception as e:
+                results.put(e)
+            finally:
+                tiff.close()
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            first = True
+            while True:
+                arr = results.get()
+                if arr is None:
+                    break
+                if isinstance(arr, Exception):
+                    raise arr
+                if not first:
+                    self.ReadDirectory()
+                first = False
+                yield arr
+        finally:
+            # unblock the producer if the iteration stopped early
+            stopped.set()
+            while thread.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        self.SetDirectory(0)
+
+    # Cached list of the offsets of the directories, see _directory_offsets
+    _dir_offsets = None
+    # client I/O of the handles opened by open_buffer
+    _client = None
+    # Cached layout of the current directory, see get_layout
+    _layout = None
+
+    def get_layout(self):
+        """ Return the TIFFLayout of the current directory.
+
+        The layout is read once per directory and cached; it is dropped
+        when the current directory changes or a field is set.
+        """
+        if self._layout is None:
+            self._layout = TIFFLayout(self)
+        return self._layout
+
+    def _directory_offsets(self):
+        """ Return the file offsets of all the directories.
+
+        The list is built on first use, by walking the directory chain
+        once, and cached. It allows jumping to any directory with
+        SetSubDirectory instead of walking the chain from the start as
+        SetDirectory does.
+        """
+        if self._dir_offsets is None:
+            current = self.CurrentDirOffset()
+            self.SetDirectory(0)
+            offsets = [self.CurrentDirOffset()]
+            while not self.LastDirectory() and self.ReadDirectory():
+                offsets.append(self.CurrentDirOffset())
+            self.SetSubDirectory(current)
+            self._dir_offsets = offsets
+        return self._dir_offsets
+
+    def set_page(self, index):
+        """ Make the directory (page) with the given index current.
+
+        Unlike SetDirectory, the directory is found in constant time using
+        the cached directory offsets.
+        """
+        offsets = self._directory_offsets()
+        if index < 0:
+            index += len(offsets)
+        if not 0 <= index < len(offsets):
+            raise IndexError("page index out of range")
+        if not self.SetSubDirectory(offsets[index]):
+            raise IOError("Failed to read directory %d" % index)
+
+    @property
+    def pages(self):
+        """ Sequence of the images of all directories.
+
+        len(tiff.pages) is the number of directories and tiff.pages[i]
+        reads the image of the i-th directory (see set_page).
+        """
+        return TIFFPages(self)
+
+    def _level_offsets(self):
+        """ Return the offsets of the resolution levels of the current
+        directory, itself first.
+        """
+        return [self.CurrentDirOffset()] + list(
+            self.GetField(TIFFTAG_SUBIFD) or [])
+
+    def levels(self):
+        """ Return the TIFFLayout of each resolution level of the image.
+
+        Level 0 is the current directory and the other levels are the
+        reduced-resolution images listed in its SubIFD tag, in that order
+        (usually decreasing resolution). Use the shape attribute of the
+        layouts to get the shapes of the arrays read by read_level.
+        """
+        offsets = self._level_offsets()
+        layouts = [self.get_layout()]
+        try:
+            for level, offset in enumerate(offsets[1:], 1):
+                if not self.SetSubDirectory(offset):
+                    raise IOError("Failed to read level %d" % level)
+                layouts.append(self.get_layout())
+        finally:
+            if len(offsets) > 1:
+                self.SetSubDirectory(offsets[0])
+        return layouts
+
+    def read_level(self, level, region=None, workers=None):
+        """ Read the image of a resolution level, see levels.
+
+        Parameters
+        ----------
+        level: int
+          Index of the level, negative values count from the coarsest
+          level.
+        region: tuple
+          (x, y, width, height) of the region to read, in the pixels of
+          the level, see read_region. By default, the whole image is read.
+        workers: int
+          Number of decoding threads used to read the whole image, see
+          read_image.
+
+        The current directory is left unchanged.
+        """
+        offsets = self._level_offsets()
+        if level < 0:
+            level += len(offsets)
+        if not 0 <= level < len(offsets):
+            raise IndexError("level index out of range")
+        if level and not self.SetSubDirectory(offsets[level]):
+            raise IOError("Failed to read level %d" % level)
+        try:
+            if region is None:
+                return TIFF.read_image(self, workers=workers)
+            return self.read_region(*region)
+        finally:
+            if level:
+                self.SetSubDirectory(offsets[0])
+
+    def level_for_size(self, width, height):
+        """ Return the index of the coarsest resolution level whose image
+        is at least width x height pixels, or 0 if there is none.
+        """
+        layouts = self.levels()
+        for level in range(len(layouts) - 1, 0, -1):
+            if (layouts[level].width >= width
+                    and layouts[level].length >= height):
+                return level
+        return 0
+
     def __del__(self):
         self.close()
 
@@ -1235,6 +2497,7 @@ class TIFF(ctypes.c_void_p):
 
     @debug
     def ReadDirectory(self):
+        self._layout = None
         return libtiff.TIFFReadDirectory(self)
     readdirectory = ReadDirectory
 
@@ -1242,10 +2505,18 @@ class TIFF(ctypes.c_void_p):
     def WriteDirectory(self):
         r = libtiff.TIFFWriteDirectory(self)
         assert r == 1, repr(r)
+        self._dir_offsets = None
+        self._layout = None
     writedirectory = WriteDirectory
 
+    @debug
+    def CurrentDirOffset(self):
+        return libtiff.TIFFCurrentDirOffset(self)
+    currentdiroffset = CurrentDirOffset
+
     @debug
     def SetDirectory(self, dirnum):
+        self._layout = None
         return libtiff.TIFFSetDirectory(self, dirnum)
     setdirectory = SetDirectory
 
@@ -1277,6 +2548,7 @@ class TIFF(ctypes.c_void_p):
             or if an error was encountered
             while reading the directory's contents.
         """
+        self._layout = None
         return libtiff.TIFFSetSubDirectory(self, diroff)
 
     @debug
@@ -1299,6 +2571,11 @@ class TIFF(ctypes.c_void_p):
         return libtiff.TIFFIsByteSwapped(self)
     isbyteswapped = IsByteSwapped
 
+    @debug
+    def IsBigTIFF(self):
+        return libtiff.TIFFIsBigTIFF(self)
+    isbigtiff = IsBigTIFF
+
     @debug
     def IsUpSampled(self):
         return libtiff.TIFFIsUpSampled(self)
@@ -1314,6 +2591,11 @@ class TIFF(ctypes.c_void_p):
         return libtiff.TIFFNumberOfStrips(self).value
     numberofstrips = NumberOfStrips
 
+    @debug
+    def NumberOfTiles(self):
+        return libtiff.TIFFNumberOfTiles(self).value
+    numberoftiles = NumberOfTiles
+
     @debug
     def WriteScanline(self, buf, row, sample=0):
         return libtiff.TIFFWriteScanline(self, buf, row, sample)
@@ -1421,6 +2703,87 @@ class TIFF(ctypes.c_void_p):
         assert r.value >= 0, repr(r.value)
         return r
 
+    def ReadRawTile(self, tile, buf, size):
+        return libtiff.TIFFReadRawTile(self, tile, buf, size).value
+    readrawtile = ReadRawTile
+
+    def ReadEncodedTile(self, tile, buf, size):
+        return libtiff.TIFFReadEncodedTile(self, tile, buf, size).value
+    readencodedtile = ReadEncodedTile
+
+    @debug
+    def WriteRawTile(self, tile, buf, size):
+        r = libtiff.TIFFWriteRawTile(self, tile, buf, size)
+        assert r.value == size, repr((r.value, size))
+    writerawtile = WriteRawTile
+
+    @debug
+    def WriteEncodedTile(self, tile, buf, size):
+        r = libtiff.TIFFWriteEncodedTile(self, tile, buf, size)
+        assert r.value == size, repr((r.value, size))
+    writeencodedtile = WriteEncodedTile
+
+    def iter_raw_chunks(self):
+        """ Iterator of the raw (still encoded) strips or tiles of the
+        current directory.
+
+        Yields (index, data) pairs in the order of the strips (or tiles),
+        where data is a memoryview over one buffer reused for all the
+        chunks: it is only valid until the next iteration, use bytes(data)
+        to keep a copy. The buffer is allocated once, for the largest
+        chunk.
+        """
+        if self.IsTiled():
+            read_raw = libtiff.TIFFReadRawTile
+        else:
+            read_raw = libtiff.TIFFReadRawStrip
+        # libtiff uses the same array for strips and tiles
+        bytecounts = self.GetField(TIFFTAG_STRIPBYTECOUNTS)
+        if bytecounts is None or not len(bytecounts):
+            return
+        buf = np.empty(int(bytecounts.max()), dtype=np.uint8)
+        data = buf.ctypes.data
+        view = memoryview(buf)
+        for index, size in enumerate(bytecounts.tolist()):
+            if size:
+                size = read_raw(self, index, data, size).value
+                if size < 0:
+                    raise IOError("Failed to read raw chunk %d" % index)
+            yield index, view[:size]
+
+    def write_raw_chunks(self, chunks):
+        """ Write already encoded strips or tiles to the current directory.
+
+        The fields of the directory, including the compression matching
+        the encoded data, must be set before, and WriteDirectory must be
+        called after. The chunks are written as they are, without
+        decoding them.
+
+        Parameters
+        ----------
+        chunks: iterable
+          (index, data) pairs, as yielded by iter_raw_chunks, where data
+          is a bytes-like object holding the encoded strip (or tile) of
+          that index.
+
+        Returns
+        -------
+        int
+          The number of bytes written.
+        """
+        if self.IsTiled():
+            write_raw = libtiff.TIFFWriteRawTile
+        else:
+            write_raw = libtiff.TIFFWriteRawStrip
+        written = 0
+        for index, data in chunks:
+            buf = np.frombuffer(data, dtype=np.uint8)
+            r = write_raw(self, index, buf.ctypes.data, buf.size).value
+            if r != buf.size:
+                raise IOError("Failed to write raw chunk %d" % index)
+            written += r
+        return written
+
     closed = False
 
     def close(self, _libtiff=libtiff):
@@ -1456,6 +2819,14 @@ class TIFF(ctypes.c_void_p):
             if not ignore_undefined_tag:
                 print('Warning: no tag %r defined' % tag)
             return
+        return self._get_field(tag, t, ignore_undefined_tag, count)
+
+    def _get_field(self, tag, t, ignore_undefined_tag=True, count=None):
+        """ Return the value of the field with numeric tag.
+
+        t is the (C type, conversion function) entry describing the tag,
+        see tifftags.
+        """
         data_type, convert = t
 
         if tag == TIFFTAG_COLORMAP:
@@ -1473,7 +2844,6 @@ class TIFF(ctypes.c_void_p):
                 return None
 
             num_cmap_elems = 1 << bps
-            data_type *= num_cmap_elems
             pdt = ctypes.POINTER(data_type)
             rdata = pdt()
             gdata = pdt()
@@ -1485,7 +2855,30 @@ class TIFF(ctypes.c_void_p):
             # ignore count, it's not used for colormap
             r = libtiff.TIFFGetField(self, c_ttag_t(tag), rdata_ptr, gdata_ptr,
                                      bdata_ptr)
-            data = (rdata, gdata, bdata)
+            data = ((rdata, gdata, bdata), num_cmap_elems)
+        elif tag == TIFFTAG_TRANSFERFUNCTION:
+            num_arrays, num_elems = self._transfer_function_size()
+            if num_elems is None:
+                return None
+            pdt = ctypes.POINTER(data_type)
+            pointers = tuple(pdt() for _ in range(3))
+            r = libtiff.TIFFGetField(self, c_ttag_t(tag),
+                                     *[ctypes.byref(p) for p in pointers])
+            data = (pointers[:num_arrays], num_elems)
+        elif tag in _pair_tags:
+            data = (data_type(), data_type())
+            r = libtiff.TIFFGetField(self, c_ttag_t(tag),
+                                     ctypes.byref(data[0]),
+                                     ctypes.byref(data[1]))
+        elif tag in _strile_tags:
+            # libtiff uses the same arrays for strips and tiles
+            ptr = data_type()
+            r = libtiff.TIFFGetField(self, c_ttag_t(tag), ctypes.byref(ptr))
+            if r:
+                if self.IsTiled():
+                    data = (ptr, self.NumberOfTiles())
+                else:
+                    data = (ptr, self.NumberOfStrips())
         elif isinstance(data_type, tuple):
             # Variable length array, with the length as first value
             count_type, data_type = data_type
@@ -1528,6 +2921,19 @@ class TIFF(ctypes.c_void_p):
         if count is not None:
             print("Warning: count argument is deprecated")
 
+        self._layout = None
+        args = self._set_field_args(tag, _value)
+        if args is None:
+            return
+        return libtiff.TIFFSetField(self, *args)
+
+    def _set_field_args(self, tag, _value):
+        """ Return the arguments of TIFFSetField following the handle, to
+        set the tag to _value, or None if the value cannot be set.
+
+        The arguments keep the data they point to alive, so they can be
+        passed to TIFFSetField several times, see write_pages.
+        """
         if isinstance(tag, str):
             tag = globals()['TIFFTAG_' + tag.upper()]
         t = tifftags.get(tag)
@@ -1552,7 +2958,7 @@ class TIFF(ctypes.c_void_p):
                     "list/tuple of lists")
                 r_arr, g_arr, b_arr = None, None, None
             if r_arr is None:
-                return
+                return None
 
             bps = self.GetField("BitsPerSample")
             if bps is None:
@@ -1561,11 +2967,28 @@ class TIFF(ctypes.c_void_p):
                     "assuming 8 bps...")
                 bps = 8
             num_cmap_elems = 1 << bps
-            data_type *= num_cmap_elems
-            r_ptr = data_type(*r_arr)
-            g_ptr = data_type(*g_arr)
-            b_ptr = data_type(*b_arr)
-            r = libtiff.TIFFSetField(self, c_ttag_t(tag), r_ptr, g_ptr, b_ptr)
+            pdt = ctypes.POINTER(data_type)
+            r_arr = _c_array(r_arr, data_type, num_cmap_elems)
+            g_arr = _c_array(g_arr, data_type, num_cmap_elems)
+            b_arr = _c_array(b_arr, data_type, num_cmap_elems)
+            return (c_ttag_t(tag), r_arr.ctypes.data_as(pdt),
+                    g_arr.ctypes.data_as(pdt), b_arr.ctypes.data_as(pdt))
+        elif tag == TIFFTAG_TRANSFERFUNCTION:
+            num_arrays, num_elems = self._transfer_function_size()
+            if num_elems is None:
+                print("Error: BitsPerSample <= 16 is required to set "
+                      "TransferFunction")
+                return None
+            if len(_value) != num_arrays:
+                raise ValueError("TransferFunction expects %d arrays, got %d"
+                                 % (num_arrays, len(_value)))
+            pdt = ctypes.POINTER(data_type)
+            return (c_ttag_t(tag),) + tuple(
+                _c_array(arr, data_type, num_elems).ctypes.data_as(pdt)
+                for arr in _value)
+        elif tag in _pair_tags:
+            first, second = _value
+            return (c_ttag_t(tag), int(first), int(second))
         else:
             count_type = None
             if isinstance(data_type, tuple):
@@ -1574,14 +2997,17 @@ class TIFF(ctypes.c_void_p):
                 count = len(_value)
                 data_type = data_type * count  # make it an array
 
-            if issubclass(data_type, (ctypes.Array, tuple, list)):
-                data = data_type(*_value)
+            if issubclass(data_type, ctypes.Array):
+                # libtiff copies the values, the array only needs to live
+                # until TIFFSetField returns
+                arr = _c_array(_value, data_type._type_, data_type._length_)
+                data = arr.ctypes.data_as(ctypes.POINTER(data_type._type_))
             elif issubclass(data_type,
                             ctypes._Pointer):  # does not include c_char_p
                 # convert to the base type, ctypes will take care of actually
                 # sending it by reference
                 base_type = data_type._type_
-                if isinstance(_value, collections.Iterable):
+                if isinstance(_value, collections.abc.Iterable):
                     data = base_type(*_value)
                 else:
                     data = base_type(_value)
@@ -1592,10 +3018,121 @@ class TIFF(ctypes.c_void_p):
                 data = data.value
 
             if count_type is None:
-                r = libtiff.TIFFSetField(self, c_ttag_t(tag), data)
+                return (c_ttag_t(tag), data)
+            return (c_ttag_t(tag), count, data)
+
+    def get_all_tags(self):
+        """ Return a dict of all the tags set in the current directory.
+
+        The keys are the <NAME> of the TIFFTAG_<NAME> constants, such as
+        'IMAGEWIDTH' or 'PHOTOMETRIC', which GetField and SetField accept
+        (or tag numbers for the tags that have no such constant), and the
+        values are the ones returned by GetField. Unlike info(), the tags
+        are not probed one name at a time: the tags stored as custom values are
+        listed by libtiff (TIFFGetTagListCount/TIFFGetTagListEntry) and
+        only the few tags that libtiff keeps in fixed directory fields
+        are queried. Custom tags whose values cannot be converted are
+        skipped.
+        """
+        return {self._tag_name(tag): value
+                for tag, value in self._get_all_fields().items()}
+
+    def _get_all_fields(self):
+        """ Return the tags of get_all_tags keyed by tag number.
+        """
+        tags = {}
+        # libtiff aliases the strip and tile arrays, only report the
+        # relevant ones
+        if self.IsTiled():
+            skip = (TIFFTAG_STRIPOFFSETS, TIFFTAG_STRIPBYTECOUNTS)
+        else:
+            skip = (TIFFTAG_TILEOFFSETS, TIFFTAG_TILEBYTECOUNTS)
+        # Scratch space used to check the presence of a tag before doing
+        # the conversion. Every tag is read with at most 3 arguments of
+        # at most 8 bytes, which may all point to the same location.
+        scratch = (ctypes.c_uint64 * 4)()
+        codec_tags = [tag for tag in _codec_tags if libtiff.TIFFFindField(
+            self, tag, TIFFDataType.TIFF_NOTYPE)]
+        for tag in _core_tags + tuple(codec_tags):
+            if tag in skip:
+                continue
+            if not libtiff.TIFFGetField(self, tag, scratch, scratch, scratch):
+                continue
+            value = self._get_field(tag, tifftags[tag])
+            if value is not None:
+                tags[tag] = value
+        for i in range(libtiff.TIFFGetTagListCount(self)):
+            tag = libtiff.TIFFGetTagListEntry(self, i)
+            t = tifftags.get(tag)
+            if t is None:
+                t = self._custom_tifftag(tag)
+                if t is None:
+                    continue
+            value = self._get_field(tag, t)
+            if value is not None:
+                tags[tag] = value
+        return tags
+
+    def _transfer_function_size(self):
+        """ Return the number of arrays of the TransferFunction tag and
+        their number of entries, or (None, None) if BitsPerSample is too
+        large for a TransferFunction.
+        """
+        bps = self.GetField("BitsPerSample") or 1
+        if bps > 16:
+            return None, None
+        samples = self.GetField("SamplesPerPixel") or 1
+        extra = len(self.GetField("ExtraSamples") or ())
+        return (3 if samples - extra > 1 else 1), 1 << bps
+
+    @staticmethod
+    def _tag_name(tag):
+        """ Return the key of the tag in get_all_tags: the <NAME> of its
+        TIFFTAG_<NAME> constant, as accepted by GetField and SetField, or
+        the tag number when there is no such constant.
+        """
+        define = define_to_name_map['TiffTag'].get(tag)
+        if define is None:
+            return tag
+        return define[len('TIFFTAG_'):]
+
+    def _custom_tifftag(self, tag):
+        """ Create a tifftags entry for a tag unknown to tifftags.
+
+        The entry is built from the libtiff field description. None is
+        returned for the fields that cannot be read safely.
+        """
+        field = libtiff.TIFFFieldWithTag(self, tag)
+        if not field or not hasattr(libtiff, 'TIFFFieldDataType'):
+            return None
+        field_type = libtiff.TIFFFieldDataType(field)
+        readcount = libtiff.TIFFFieldReadCount(field)
+        passcount = libtiff.TIFFFieldPassCount(field)
+        if field_type in (TIFFDataType.TIFF_RATIONAL,
+                          TIFFDataType.TIFF_SRATIONAL):
+            # Rationals are returned as float or double depending on
+            # the field definition
+            if not hasattr(libtiff, 'TIFFFieldSetGetSize'):
+                return None
+            if libtiff.TIFFFieldSetGetSize(field) == 4:
+                data_t = ctypes.c_float
             else:
-                r = libtiff.TIFFSetField(self, c_ttag_t(tag), count, data)
-        return r
+                data_t = ctypes.c_double
+        else:
+            data_t = _custom_ttype2ctype.get(field_type)
+        if data_t is None:
+            return None
+        if field_type == TIFFDataType.TIFF_ASCII:
+            return (ctypes.c_char_p, lambda d: d.value)
+        if readcount == 1 and not passcount:
+            return (data_t, lambda d: d.value)
+        if readcount == TIFF_VARIABLE and passcount:
+            return ((ctypes.c_uint16, data_t), lambda d: d[1][:d[0]])
+        if readcount == TIFF_VARIABLE2 and passcount:
+            return ((ctypes.c_uint32, data_t), lambda d: d[1][:d[0]])
+        # fixed size arrays and per-sample values have various calling
+        # conventions in libtiff
+        return None
 
     def info(self):
         """ Return a string containing <tag name: field value> map.
@@ -1627,7 +3164,10 @@ class TIFF(ctypes.c_void_p):
                         'CZ_LSMInfo'
                         ]:
             v = self.GetField(tagname)
-            if v:
+            if isinstance(v, np.ndarray):
+                # strip and tile arrays
+                _l.append('%s: %s' % (tagname, v))
+            elif v:
                 if isinstance(v, int):
                     v = define_to_name_map.get(tagname, {}).get(v, v)
                 _l.append('%s: %s' % (tagname, v))
@@ -1635,7 +3175,7 @@ class TIFF(ctypes.c_void_p):
                     print(CZ_LSMInfo(self))
         return '\n'.join(_l)
 
-    def copy(self, filename, **kws):
+    def copy(self, filename, tile_size=None, rows_per_strip=None, **kws):
         """ Copy opened TIFF file to a new file.
 
         Use keyword arguments to redefine tag values.
@@ -1644,13 +3184,30 @@ class TIFF(ctypes.c_void_p):
         ----------
         filename : str
           Specify the name of file where TIFF file is copied to.
+        tile_size : int or (int, int)
+          Write tiled images with tiles of this (width, length), which
+          must be multiples of 16.
+        rows_per_strip : int
+          Write stripped images with strips of this number of rows.
+          By default, the strips or tiles of the input are kept.
         compression : {'none', 'lzw', 'deflate', ...}
           Specify compression scheme.
         bitspersample : {8,16,32,64,128,256}
           Specify bit size of a sample.
         sampleformat : {'uint', 'int', 'float', 'complex'}
           Specify sample format.
+
+        When the encoding of the pixels is unchanged (same layout,
+        compression and predictor), the strips or tiles are copied as
+        they are, without decoding them. Otherwise, the image is decoded
+        and encoded again one band of rows at a time, so that the memory
+        used does not depend on the image size. The reduced-resolution
+        levels of the pages (see levels) are copied as their SubIFDs.
         """
+        if tile_size is not None and rows_per_strip is not None:
+            raise ValueError("tile_size and rows_per_strip are exclusive")
+        if isinstance(tile_size, int):
+            tile_size = (tile_size, tile_size)
         other = TIFF.open(filename, mode='w')
         define_rewrite = {}
         for _name, _value in list(kws.items()):
@@ -1662,28 +3219,37 @@ class TIFF(ctypes.c_void_p):
                 _value = TIFF._fix_sampleformat(_value)
             define_rewrite[define] = _value
         name_define_list = list(name_to_define_map['TiffTag'].items())
-        self.SetDirectory(0)
-        self.ReadDirectory()
-        while 1:
-            other.SetDirectory(self.CurrentDirectory())
-            bits = self.GetField('BitsPerSample')
-            sample_format = self.GetField('SampleFormat')
-            assert bits >= 8, repr((bits, sample_format))
-            itemsize = bits // 8
-            dtype = self.get_numpy_type(bits, sample_format)
+        if tile_size is not None or rows_per_strip is not None:
+            # the organization of the output is redefined
+            skip = (TIFFTAG_TILEWIDTH, TIFFTAG_TILELENGTH,
+                    TIFFTAG_ROWSPERSTRIP)
+        else:
+            skip = ()
+
+        def copy_directory(subifds):
+            """ Copy the current directory to other, with room for the
+            given number of SubIFDs, which must be copied next.
+            """
+            layout = self.get_layout()
+            bits = layout.bits_per_sample
+            assert bits >= 8, repr((bits, layout.sample_format))
             for _name, define in name_define_list:
                 # Skip TIFFTAG_COLORMAP if BitsPerSample > 16, as it's typically for paletted images (8 or 16 bits).
                 # Trying to read it for higher bit depths can lead to errors.
-                if define == TIFFTAG_COLORMAP and self.GetField('BitsPerSample') > 16:
+                if define == TIFFTAG_COLORMAP and bits > 16:
                     continue
                 # Skip TIFFTAG_PREDICTOR if compression is none, as it's only relevant when compression is used.
-                if define == TIFFTAG_PREDICTOR and define_rewrite.get(TIFFTAG_COMPRESSION, self.GetField('Compression')) == COMPRESSION_NONE:
+                if define == TIFFTAG_PREDICTOR and define_rewrite.get(
+                        TIFFTAG_COMPRESSION, layout.compression) == COMPRESSION_NONE:
                     continue
                 orig_value = self.GetField(define)
                 if orig_value is None and define not in define_rewrite:
                     continue
+                # the offsets of the SubIFDs are those of the source file,
+                # the SubIFDs are copied after the directory
                 if (_name.endswith('OFFSETS') or _name.endswith('BYTECOUNTS')
-                    or define == TIFFTAG_DATATYPE):  # old version of SampleFormat
+                    or define == TIFFTAG_DATATYPE  # old version of SampleFormat
+                    or define == TIFFTAG_SUBIFD or define in skip):
                     continue
                 if define in define_rewrite:
                     _value = define_rewrite[define]
@@ -1692,26 +3258,739 @@ class TIFF(ctypes.c_void_p):
                 if _value is None:
                     continue
                 other.SetField(define, _value)
-            new_bits = other.GetField('BitsPerSample')
-            new_sample_format = other.GetField('SampleFormat')
-            new_dtype = other.get_numpy_type(new_bits, new_sample_format)
+            if subifds:
+                other.SetField(TIFFTAG_SUBIFD, [0] * subifds)
+            if tile_size is not None:
+                other.SetField(TIFFTAG_TILEWIDTH, tile_size[0])
+                other.SetField(TIFFTAG_TILELENGTH, tile_size[1])
+            elif rows_per_strip is not None:
+                other.SetField(TIFFTAG_ROWSPERSTRIP, rows_per_strip)
+            new_layout = other.get_layout()
+            new_bits = new_layout.bits_per_sample
+            new_dtype = new_layout.dtype
             assert new_bits >= 8, repr(
-                (new_bits, new_sample_format, new_dtype))
-            new_itemsize = new_bits // 8
-            strip_size = self.StripSize()
-            buf = np.zeros(strip_size // itemsize, dtype)
-            for strip in range(self.NumberOfStrips()):
-                elem = self.ReadEncodedStrip(strip, buf.ctypes.data,
-                                             strip_size)
-                if elem > 0:
-                    new_buf = buf.astype(new_dtype)
-                    other.WriteEncodedStrip(strip, new_buf.ctypes.data,
-                                            (elem * new_itemsize) // itemsize)
-            self.ReadDirectory()
-            if self.LastDirectory():
-                break
+                (new_bits, new_layout.sample_format, new_dtype))
+            # JPEG data depends on tables and color conversion settings
+            # that are not copied as such
+            if (new_layout == layout and not self.IsByteSwapped()
+                    and TIFFTAG_PREDICTOR not in define_rewrite
+                    and layout.compression not in (COMPRESSION_JPEG,
+                                                   COMPRESSION_OJPEG)):
+                other.write_raw_chunks(self.iter_raw_chunks())
+            else:
+                self._copy_bands(other, layout, new_layout)
+            other.WriteDirectory()
+
+        for page in range(len(self._directory_offsets())):
+            self.set_page(page)
+            # libtiff writes the directories following one with a SubIFD
+            # tag as its SubIFDs
+            offsets = self._level_offsets()
+            copy_directory(len(offsets) - 1)
+            for level, offset in enumerate(offsets[1:], 1):
+                if not self.SetSubDirectory(offset):
+                    raise IOError("Failed to read level %d" % level)
+                copy_directory(0)
         other.close()
 
+    def _copy_bands(self, other, layout, new_layout):
+        """ Decode the current image and encode it in other.
+
+        The image is processed one band of rows at a time. A band is made
+        of whole output strips (or rows of tiles) and spans at least one
+        input strip (or row of tiles). The input is decoded one chunk
+        height at a time, and the rows of the last decoded chunk that do
+        not fit in a band are kept for the next one, so that each input
+        chunk is decoded once.
+        """
+        if layout.tiled and layout.depth > 1:
+            raise NotImplementedError("Copy of images with ImageDepth > 1")
+        width = layout.width
+        length = layout.length
+        if layout.tiled:
+            in_rows = layout.tile_length
+        else:
+            in_rows = min(layout.rows_per_strip, length)
+        if new_layout.tiled:
+            out_rows = new_layout.tile_length
+            out_cols = new_layout.tile_width
+        else:
+            out_rows = min(new_layout.rows_per_strip, length)
+        band_rows = out_rows * -(-in_rows // out_rows)
+        new_dtype = new_layout.dtype
+        samples_pp = layout.samples_per_pixel
+        separate = (samples_pp > 1
+                    and layout.planar_config == PLANARCONFIG_SEPARATE)
+        row_axis = 1 if separate else 0
+        strips_per_plane = -(-length // out_rows)
+        tile = None
+
+        def bands():
+            pending = []
+            decoded = 0
+            for y in range(0, length, band_rows):
+                stop = min(y + band_rows, length)
+                while decoded < stop:
+                    rows = min(in_rows, length - decoded)
+                    pending.append(self.read_region(0, decoded, width, rows))
+                    decoded += rows
+                if len(pending) > 1:
+                    band = np.concatenate(pending, row_axis)
+                else:
+                    band = pending[0]
+                band, rest = np.split(band, [stop - y], row_axis)
+                pending = [rest] if rest.shape[row_axis] else []
+                yield y, band
+
+        for y, band in bands():
+            band = band.astype(new_dtype, copy=False)
+            planes = band if separate else [band]
+            for plane_index, plane in enumerate(planes):
+                for r0 in range(0, plane.shape[0], out_rows):
+                    rows = plane[r0:r0 + out_rows]
+                    if not new_layout.tiled:
+                        strip = (plane_index * strips_per_plane
+                                 + (y + r0) // out_rows)
+                        data = np.ascontiguousarray(rows)
+                        other.WriteEncodedStrip(strip, data.ctypes.data,
+                                                data.nbytes)
+                        continue
+                    if tile is None:
+                        tile = np.zeros((out_rows, out_cols) + rows.shape[2:],
+                                        dtype=new_dtype)
+                    for x in range(0, width, out_cols):
+                        data = rows[:, x:x + out_cols]
+                        if data.shape[:2] != tile.shape[:2]:
+                            # edge tile, padded with zeros
+                            tile[...] = 0
+                        tile[:data.shape[0], :data.shape[1]] = data
+                        other.WriteTile(tile.ctypes.data, x, y + r0, 0,
+                                        plane_index)
+
+
+# libdeflate, that libtiff uses when it is available, compresses much
+# faster than zlib. It is loaded when needed, see _deflate.
+_libdeflate = None
+_deflate_local = threading.local()
+
+
+def _load_libdeflate():
+    """ Return the libdeflate library, or False if it is not found. """
+    global _libdeflate
+    if _libdeflate is None:
+        from ctypes.util import find_library
+        name = find_library('deflate')
+        try:
+            lib = ctypes.CDLL(name) if name else False
+        except OSError:
+            lib = False
+        if lib:
+            lib.libdeflate_alloc_compressor.restype = ctypes.c_void_p
+            lib.libdeflate_alloc_compressor.argtypes = [ctypes.c_int]
+            lib.libdeflate_free_compressor.restype = None
+            lib.libdeflate_free_compressor.argtypes = [ctypes.c_void_p]
+            lib.libdeflate_zlib_compress_bound.restype = ctypes.c_size_t
+            lib.libdeflate_zlib_compress_bound.argtypes = [ctypes.c_void_p,
+                                                           ctypes.c_size_t]
+            lib.libdeflate_zlib_compress.restype = ctypes.c_size_t
+            lib.libdeflate_zlib_compress.argtypes = [
+                ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t,
+                ctypes.c_void_p, ctypes.c_size_t]
+        _libdeflate = lib
+    return _libdeflate
+
+
+class _LibdeflateCompressor(object):
+    """ libdeflate compressor, which must only be used by one thread. """
+
+    def __init__(self, lib, level):
+        self.lib = lib
+        self.level = level
+        self.handle = lib.libdeflate_alloc_compressor(level)
+        if not self.handle:
+            raise MemoryError("Failed to allocate a libdeflate compressor")
+
+    def compress(self, arr):
+        bound = self.lib.libdeflate_zlib_compress_bound(self.handle,
+                                                        arr.nbytes)
+        out = ctypes.create_string_buffer(bound)
+        size = self.lib.libdeflate_zlib_compress(
+            self.handle, arr.ctypes.data, arr.nbytes, out, bound)
+        if not size:
+            raise IOError("libdeflate compression failed")
+        return ctypes.string_at(out, size)
+
+    def __del__(self):
+        if self.handle:
+            self.lib.libdeflate_free_compressor(self.handle)
+
+
+def _deflate(arr, level):
+    """ Compress the contiguous array arr like the libtiff deflate codec.
+
+    level is the TIFFTAG_ZIPQUALITY value. This function can be called
+    concurrently, each thread has its own compressor.
+    """
+    lib = _load_libdeflate()
+    if level == zlib.Z_DEFAULT_COMPRESSION:
+        level = 6
+    if not lib:
+        return zlib.compress(arr, min(level, 9))
+    compressor = getattr(_deflate_local, 'compressor', None)
+    if compressor is None or compressor.level != level:
+        compressor = _LibdeflateCompressor(lib, level)
+        _deflate_local.compressor = compressor
+    return compressor.compress(arr)
+
+
+def _ordered_map(func, items, workers):
+    """ Like map(func, items), with func called by worker threads.
+
+    At most 2 * workers items are processed ahead of the consumer, so
+    that the items and results are not all held in memory.
+    """
+    with ThreadPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class _ChunkEncoder(object):
+    """ Encoder of the strips (or tiles) of the current directory of a
+    TIFF, that can be called concurrently by several threads.
+
+    Deflate data without predictor nor byte swapping is compressed with
+    libdeflate when it is available, or zlib otherwise (see _deflate).
+    Other chunks are encoded by libtiff: each thread writes them as the
+    first strip (or tile) of its own in-memory TIFF, whose fields are
+    those of the directory, and the encoded bytes are read back from it.
+    """
+
+    def __init__(self, tiff):
+        layout = tiff.get_layout()
+        self.tiled = layout.tiled
+        # libtiff swaps the bytes of the data in place
+        self.copy = bool(tiff.IsByteSwapped()) and layout.bits_per_sample > 8
+        self.zip_quality = None
+        if (layout.compression in (COMPRESSION_DEFLATE,
+                                   COMPRESSION_ADOBE_DEFLATE)
+                and tiff.GetField(TIFFTAG_PREDICTOR) in (None,
+                                                         PREDICTOR_NONE)
+                and not self.copy):
+            quality = ctypes.c_int(zlib.Z_DEFAULT_COMPRESSION)
+            libtiff.TIFFGetField(tiff, TIFFTAG_ZIPQUALITY,
+                                 ctypes.byref(quality))
+            self.zip_quality = quality.value
+            return
+        self.mode = 'w'
+        if tiff.IsByteSwapped():
+            self.mode += 'b' if sys.byteorder == 'little' else 'l'
+        self.args = []
+        for tag, value in tiff._get_all_fields().items():
+            if tag in _strile_tags or tag == TIFFTAG_SUBIFD:
+                continue
+            args = tiff._set_field_args(tag, value)
+            if args is not None:
+                self.args.append(args)
+        # settings of the codecs that are not stored in the file
+        for tag in _encoder_pseudo_tags:
+            value = ctypes.c_int()
+            if (libtiff.TIFFFindField(tiff, tag, TIFFDataType.TIFF_NOTYPE)
+                    and libtiff.TIFFGetField(tiff, tag, ctypes.byref(value))):
+                self.args.append((c_ttag_t(tag), value.value))
+        self.local = threading.local()
+        self.handles = []
+        self.lock = threading.Lock()
+
+    def __call__(self, chunk):
+        """ Return the encoded bytes of the chunk array. """
+        if self.zip_quality is not None:
+            return _deflate(np.ascontiguousarray(chunk), self.zip_quality)
+        if self.copy:
+            chunk = np.array(chunk, copy=True, order='C')
+        else:
+            chunk = np.ascontiguousarray(chunk)
+        handle = getattr(self.local, 'handle', None)
+        if handle is None:
+            handle = TIFF.open_buffer(io.BytesIO(), self.mode)
+            for args in self.args:
+                libtiff.TIFFSetField(handle, *args)
+            self.local.handle = handle
+            with self.lock:
+                self.handles.append(handle)
+        # the chunk replaces the previous one, or is appended to the
+        # buffer when it is larger
+        if self.tiled:
+            handle.WriteEncodedTile(0, chunk.ctypes.data, chunk.nbytes)
+            offset = handle.GetField(TIFFTAG_TILEOFFSETS)[0]
+            count = handle.GetField(TIFFTAG_TILEBYTECOUNTS)[0]
+        else:
+            handle.WriteEncodedStrip(0, chunk.ctypes.data, chunk.nbytes)
+            offset = handle.GetField(TIFFTAG_STRIPOFFSETS)[0]
+            count = handle.GetField(TIFFTAG_STRIPBYTECOUNTS)[0]
+        with handle._client.source.getbuffer() as view:
+            return bytes(view[offset:offset + count])
+
+    def close(self):
+        """ Close the in-memory TIFFs of the threads. """
+        if self.zip_quality is None:
+            for handle in self.handles:
+                handle.close()
+            del self.handles[:]
+
+
+def _rows_reader(arr):
+    """ Return a read_rows(start, stop) function for arr. """
+    def read_rows(start, stop):
+        return arr[start:stop]
+    return read_rows
+
+
+class _PyramidLevel(object):
+    """ Array-like image given to write_tiles by TIFF.write_pyramid.
+
+    The rows are obtained with read_rows one band of band_rows rows at a
+    time, as write_tiles goes through the rows of tiles. Each band is
+    downsampled into the rows of the reduced array when it is loaded.
+    """
+
+    def __init__(self, read_rows, shape, dtype, band_rows, reduced,
+                 downsample):
+        self.read_rows = read_rows
+        self.shape = shape
+        self.dtype = dtype
+        self.itemsize = dtype.itemsize
+        self.band_rows = band_rows
+        self.reduced = reduced
+        self.downsample = downsample
+        self._start = None
+        self._band = None
+
+    def __getitem__(self, key):
+        rows = key[0]
+        start = rows.start - rows.start % self.band_rows
+        if start != self._start:
+            self._load(start)
+        return self._band[(slice(rows.start - start, rows.stop - start),)
+                          + key[1:]]
+
+    def _load(self, start):
+        stop = min(start + self.band_rows, self.shape[0])
+        band = np.asarray(self.read_rows(start, stop), dtype=self.dtype)
+        if band.shape != (stop - start,) + self.shape[1:]:
+            raise ValueError("Expected rows of shape %s, got %s"
+                             % ((stop - start,) + self.shape[1:], band.shape))
+        if self.reduced is not None:
+            reduced = self.downsample(band)
+            self.reduced[start // 2:start // 2 + reduced.shape[0]] = reduced
+        self._start = start
+        self._band = band
+
+
+def _pad_even(band):
+    """ Repeat the last row and column of band to get even dimensions. """
+    pad = [(0, band.shape[0] % 2), (0, band.shape[1] % 2)]
+    if pad[0][1] or pad[1][1]:
+        band = np.pad(band, pad + [(0, 0)] * (band.ndim - 2), mode='edge')
+    return band
+
+
+def _downsample_nearest(band):
+    return band[::2, ::2]
+
+
+def _downsample_mean(band):
+    band = _pad_even(band)
+    height, width = band.shape[:2]
+    blocks = band.reshape((height // 2, 2, width // 2, 2) + band.shape[2:])
+    if np.issubdtype(band.dtype, np.integer) or band.dtype == np.bool_:
+        total = blocks.sum(axis=(1, 3), dtype=np.int64)
+        return ((total + 2) // 4).astype(band.dtype)
+    return blocks.mean(axis=(1, 3)).astype(band.dtype)
+
+
+def _downsample_mode(band):
+    band = _pad_even(band)
+    values = np.stack([band[0::2, 0::2], band[0::2, 1::2],
+                       band[1::2, 0::2], band[1::2, 1::2]], axis=-1)
+    values.sort(axis=-1)
+    a, b, c, d = (values[..., i] for i in range(4))
+    # with 4 sorted values, a value present at least twice is either b
+    # (== c), a (== b) or c (== d); ties go to the smallest value
+    return np.where(b == c, b, np.where(a == b, a, np.where(c == d, c, a)))
+
+
+_downsample_methods = {
+    'mean': _downsample_mean,
+    'nearest': _downsample_nearest,
+    'mode': _downsample_mode,
+}
+
+
+# Procedures given to TIFFClientOpen
+_TIFFReadWriteProc = ctypes.CFUNCTYPE(ctypes.c_ssize_t, ctypes.c_void_p,
+                                      ctypes.c_void_p, ctypes.c_ssize_t)
+_TIFFSeekProc = ctypes.CFUNCTYPE(c_toff_t_base, ctypes.c_void_p,
+                                 c_toff_t_base, ctypes.c_int)
+_TIFFCloseProc = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p)
+_TIFFSizeProc = ctypes.CFUNCTYPE(c_toff_t_base, ctypes.c_void_p)
+_TIFFMapFileProc = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p,
+                                    ctypes.POINTER(ctypes.c_void_p),
+                                    ctypes.POINTER(c_toff_t_base))
+_TIFFUnmapFileProc = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p,
+                                      c_toff_t_base)
+
+
+class _TIFFClient(object):
+    """ I/O procedures of TIFFClientOpen over a Python object, see
+    TIFF.open_buffer.
+
+    Objects supporting the buffer protocol (bytes, mmap, ...) and
+    io.BytesIO, opened for reading, are read in place through a numpy
+    array, which libtiff also maps. Other objects are used as binary
+    file objects.
+    """
+
+    def __init__(self, source, mode):
+        self.source = source
+        self.array = None
+        self.fileobj = None
+        self.pos = 0
+        # bytes read in place of the start of the file, see open_append
+        self.header = None
+        # called with the client once libtiff has closed the handle
+        self.on_close = None
+        writing = bool(set(mode) & set('wa+'))
+        buffer = None
+        if not writing:
+            if hasattr(source, 'getbuffer'):
+                buffer = source.getbuffer()
+            else:
+                try:
+                    buffer = memoryview(source)
+                except TypeError:
+                    pass
+        if buffer is not None:
+            self.array = np.frombuffer(buffer, np.uint8)
+        elif hasattr(source, 'seek'):
+            self.fileobj = source
+            if 'w' in mode:
+                source.seek(0)
+                source.truncate()
+        elif writing:
+            raise ValueError("Writing requires a file object, not %s"
+                             % type(source).__name__)
+        else:
+            raise TypeError("Expected a bytes-like or file object, not %s"
+                            % type(source).__name__)
+        self.procs = (_TIFFReadWriteProc(self._read),
+                      _TIFFReadWriteProc(self._write),
+                      _TIFFSeekProc(self._seek),
+                      _TIFFCloseProc(self._close),
+                      _TIFFSizeProc(self._size),
+                      _TIFFMapFileProc(self._map),
+                      _TIFFUnmapFileProc(self._unmap))
+
+    def size(self):
+        if self.array is not None:
+            return len(self.array)
+        pos = self.fileobj.tell()
+        size = self.fileobj.seek(0, os.SEEK_END)
+        self.fileobj.seek(pos)
+        return size
+
+    # The procedures cannot raise, errors are reported to libtiff with -1
+
+    def _read(self, handle, buf, size):
+        try:
+            if self.array is None:
+                pos = self.fileobj.tell()
+                chunk = (ctypes.c_char * size).from_address(buf)
+                count = self.fileobj.readinto(chunk) or 0
+                if self.header is not None and pos < len(self.header):
+                    overlap = min(count, len(self.header) - pos)
+                    ctypes.memmove(buf, self.header[pos:pos + overlap],
+                                   overlap)
+                return count
+            count = max(0, min(size, len(self.array) - self.pos))
+            ctypes.memmove(buf, self.array.ctypes.data + self.pos, count)
+            self.pos += count
+            return count
+        except Exception:
+            return -1
+
+    def _write(self, handle, buf, size):
+        try:
+            if self.fileobj is None:
+                return -1
+            chunk = (ctypes.c_char * size).from_address(buf)
+            return self.fileobj.write(chunk)
+        except Exception:
+            return -1
+
+    def _seek(self, handle, offset, whence):
+        try:
+            if self.fileobj is not None:
+                return self.fileobj.seek(offset, whence)
+            if whence == os.SEEK_CUR:
+                offset += self.pos
+            elif whence == os.SEEK_END:
+                offset += len(self.array)
+            self.pos = offset
+            return offset
+        except Exception:
+            return -1 % 2 ** (8 * ctypes.sizeof(c_toff_t_base))
+
+    def _close(self, handle):
+        # release the buffer, the io.BytesIO can be resized again
+        self.array = None
+        if self.on_close is not None:
+            try:
+                self.on_close(self)
+            except Exception as msg:
+                warnings.warn("Failed to close %r: %s" % (self.source, msg))
+                return -1
+        return 0
+
+    def _size(self, handle):
+        try:
+            return self.size()
+        except Exception:
+            return 0
+
+    def _map(self, handle, base, size):
+        if self.array is None:
+            return 0
+        base[0] = self.array.ctypes.data
+        size[0] = len(self.array)
+        return 1
+
+    def _unmap(self, handle, base, size):
+        pass
+
+
+def _read_tiff_header(fileobj):
+    """ Return the header of the TIFF file object, its struct byte order,
+    whether it is a BigTIFF file and the offset of its first directory.
+    """
+    fileobj.seek(0)
+    header = fileobj.read(16)
+    order = {b'II': '<', b'MM': '>'}.get(header[:2])
+    version = struct.unpack(order + 'H', header[2:4])[0] if order else None
+    if version == 42:
+        return header[:8], order, False, struct.unpack(order + 'I',
+                                                       header[4:8])[0]
+    if version == 43:
+        return header, order, True, struct.unpack(order + 'Q',
+                                                  header[8:16])[0]
+    raise ValueError("Not a TIFF file: %r" % (header[:4],))
+
+
+def _last_directory_offset(fileobj, order, bigtiff, offset):
+    """ Return the offset of the last directory of the chain starting at
+    offset in the TIFF file object.
+
+    A ValueError is raised when the chain leads to something that does
+    not look like a directory: no entries, entries beyond the end of the
+    file or a first entry of unknown type.
+    """
+    if bigtiff:
+        count_format, entry_size, next_format = 'Q', 20, 'Q'
+    else:
+        count_format, entry_size, next_format = 'H', 12, 'I'
+    count_size = struct.calcsize(count_format)
+    next_size = struct.calcsize(next_format)
+    file_size = fileobj.seek(0, os.SEEK_END)
+    seen = set()
+    while True:
+        if offset in seen:
+            raise ValueError("Loop in the directories at offset %d" % offset)
+        seen.add(offset)
+        fileobj.seek(offset)
+        count = struct.unpack(order + count_format,
+                              fileobj.read(count_size))[0]
+        end = offset + count_size + count * entry_size + next_size
+        if not count or end > file_size:
+            raise ValueError("No directory at offset %d" % offset)
+        field_type = struct.unpack(order + 'HH', fileobj.read(4))[1]
+        # TIFF_BYTE to TIFF_IFD8
+        if not 1 <= field_type <= 18:
+            raise ValueError("No directory at offset %d" % offset)
+        fileobj.seek(offset + count_size + count * entry_size)
+        next_offset = struct.unpack(order + next_format,
+                                    fileobj.read(next_size))[0]
+        if next_offset == 0:
+            return offset
+        offset = next_offset
+
+
+class TIFFLayout(object):
+    """ Snapshot of the fields describing the image of a TIFF directory.
+
+    The fields are read with direct TIFFGetField calls. Use
+    TIFF.get_layout() to get the cached layout of the current directory.
+    """
+
+    __slots__ = ('width', 'length', 'depth', 'tiled', 'tile_width',
+                 'tile_length', 'samples_per_pixel', 'bits_per_sample',
+                 'sample_format', 'planar_config', 'compression',
+                 'rows_per_strip')
+
+    def __init__(self, tiff):
+        def get(tag, ctype, default=None):
+            value = ctype()
+            if libtiff.TIFFGetField(tiff, tag, ctypes.byref(value)):
+                return value.value
+            return default
+
+        uint16, uint32 = ctypes.c_uint16, ctypes.c_uint32
+        self.width = get(TIFFTAG_IMAGEWIDTH, uint32)
+        self.length = get(TIFFTAG_IMAGELENGTH, uint32, 1)
+        self.depth = get(TIFFTAG_IMAGEDEPTH, uint32, 1)
+        self.tiled = bool(libtiff.TIFFIsTiled(tiff))
+        self.tile_width = get(TIFFTAG_TILEWIDTH, uint32)
+        self.tile_length = get(TIFFTAG_TILELENGTH, uint32)
+        # this number includes extra samples
+        self.samples_per_pixel = get(TIFFTAG_SAMPLESPERPIXEL, uint16, 1)
+        # Note: In the TIFF specification, BitsPerSample and
+        # SampleFormat are per samples. However, libtiff doesn't
+        # support mixed format, so it will always return just one
+        # value (or raise an error).
+        self.bits_per_sample = get(TIFFTAG_BITSPERSAMPLE, uint16)
+        self.sample_format = get(TIFFTAG_SAMPLEFORMAT, uint16)
+        self.planar_config = get(TIFFTAG_PLANARCONFIG, uint16,
+                                 PLANARCONFIG_CONTIG)
+        self.compression = get(TIFFTAG_COMPRESSION, uint16, COMPRESSION_NONE)
+        self.rows_per_strip = get(TIFFTAG_ROWSPERSTRIP, uint32, self.length)
+
+    @property
+    def dtype(self):
+        """ Numpy type of the samples, see TIFF.get_numpy_type. """
+        return TIFF.get_numpy_type(self.bits_per_sample, self.sample_format)
+
+    @property
+    def shape(self):
+        """ Shape of the array returned by TIFF.read_image. """
+        if self.samples_per_pixel == 1:
+            if self.tiled and self.depth > 1:
+                return (self.depth, self.length, self.width)
+            return (self.length, self.width)
+        if self.planar_config == PLANARCONFIG_CONTIG:
+            return (self.length, self.width, self.samples_per_pixel)
+        if self.planar_config == PLANARCONFIG_SEPARATE:
+            return (self.samples_per_pixel, self.length, self.width)
+        raise IOError("Unexpected PlanarConfig = %d" % self.planar_config)
+
+    def __eq__(self, other):
+        if not isinstance(other, TIFFLayout):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name)
+                   for name in self.__slots__)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self.__slots__))
+
+
+class TIFFImageWriter(object):
+    """ Writer of an image given in blocks of rows, see TIFF.begin_image.
+
+    Each strip is encoded and written as soon as all its rows have been
+    given, so that at most one strip is held in memory. It can be used
+    as a context manager, which closes it when no exception is raised.
+    """
+
+    def __init__(self, tiff, shape, dtype, rows_per_strip):
+        self.tiff = tiff
+        self.shape = shape
+        self.dtype = dtype
+        self.rows_per_strip = rows_per_strip
+        self.rows_written = 0
+        self.closed = False
+        self._strip = None
+        # libtiff swaps the bytes of the data in place
+        self._copy_rows = bool(tiff.IsByteSwapped()) and dtype.itemsize > 1
+
+    def write_rows(self, block):
+        """ Write the next rows of the image.
+
+        block is an array of shape (rows, width[, samples]), that is
+        converted to the dtype of the image if needed.
+        """
+        if self.closed:
+            raise ValueError("write_rows on a closed writer")
+        block = np.asarray(block, dtype=self.dtype)
+        if block.shape[1:] != self.shape[1:]:
+            raise ValueError("Expected rows of shape %r, got %r"
+                             % (self.shape[1:], block.shape[1:]))
+        height = self.shape[0]
+        if self.rows_written + len(block) > height:
+            raise ValueError("Too many rows: %d of %d rows written, got %d"
+                             % (self.rows_written, height, len(block)))
+        rows = self.rows_per_strip
+        while len(block):
+            index, start = divmod(self.rows_written, rows)
+            strip_rows = min(rows, height - index * rows)
+            count = min(strip_rows - start, len(block))
+            if start == 0 and count == strip_rows and not self._copy_rows:
+                # a whole strip, written without going through the buffer
+                strip = np.ascontiguousarray(block[:count])
+            else:
+                if self._strip is None:
+                    self._strip = np.empty((rows,) + self.shape[1:],
+                                           self.dtype)
+                self._strip[start:start + count] = block[:count]
+                strip = self._strip[:start + count]
+            block = block[count:]
+            self.rows_written += count
+            if start + count == strip_rows:
+                self.tiff.WriteEncodedStrip(index, strip.ctypes.data,
+                                            strip.nbytes)
+
+    def close(self):
+        """ Write the directory of the image, once all its rows have been
+        written.
+        """
+        if self.closed:
+            return
+        if self.rows_written != self.shape[0]:
+            raise ValueError("Only %d of %d rows were written"
+                             % (self.rows_written, self.shape[0]))
+        self.tiff.WriteDirectory()
+        self.closed = True
+        self._strip = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class TIFFPages(collections.abc.Sequence):
+    """ Sequence of the images stored in the directories of a TIFF file.
+
+    See TIFF.pages.
+    """
+
+    def __init__(self, tiff):
+        self.tiff = tiff
+
+    def __len__(self):
+        return len(self.tiff._directory_offsets())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        self.tiff.set_page(index)
+        # not the stack of TIFF3D.read_image
+        return TIFF.read_image(self.tiff)
+
 
 class TIFF3D(TIFF):
     """subclass of TIFF for handling import of 3D (multi-directory) files.
@@ -1755,72 +4034,44 @@ class TIFF3D(TIFF):
                 libtiff.TIFFOpenW.restype = TIFF
 
     @debug
-    def read_image(self, verbose=False, as3d=True):
+    def read_image(self, verbose=False, as3d=True, out=None, workers=None):
         """ Read image from TIFF and return it as a numpy array.
 
-        If as3d is passed True (default), will attempt to read multiple
-        directories, and restore as slices in a 3D array. ASSUMES that all
-        images in the tiff file have the same width, height, bits-per-sample,
-        compression, and so on. If you get a segfault, this is probably the
-        problem.
+        If as3d is passed True (default), will read all the directories,
+        and restore them as slices in an array of shape (depth,) + the
+        shape of one image. Every image must have the same shape and
+        sample type as the first one, otherwise ValueError is raised.
+
+        out can be a preallocated C-contiguous array (or numpy.memmap)
+        into which the images are decoded. With workers > 1, the images
+        are decoded concurrently, each thread using its own handle on the
+        file.
         """
         if not as3d:
-            return TIFF.read_image(self, verbose)
-
-        # Code is initially copy-paste from TIFF:
-        width = self.GetField('ImageWidth')
-        height = self.GetField('ImageLength')
-        bits = self.GetField('BitsPerSample')
-        sample_format = self.GetField('SampleFormat')
-        compression = self.GetField('Compression')
-
-        typ = self.get_numpy_type(bits, sample_format)
-
-        if typ is None:
-            if bits == 1:
-                typ = np.uint8
-                itemsize = 1
-            elif bits == 4:
-                typ = np.uint32
-                itemsize = 4
-            else:
-                raise NotImplementedError(repr(bits))
-        else:
-            itemsize = bits / 8
-
-        # in order to allocate the numpy array, we must count the directories:
-        # code borrowed from TIFF.iter_images():
-        depth = 0
-        while True:
-            depth += 1
-            if self.LastDirectory():
-                break
-            self.ReadDirectory()
-        self.SetDirectory(0)
-
-        # we proceed assuming all directories have the same properties from
-        # above.
-        layer_size = width * height * itemsize
-        # total_size = layer_size * depth
-        arr = np.zeros((depth, height, width), typ)
+            return TIFF.read_image(self, verbose, workers=workers, out=out)
+
+        offsets = self._directory_offsets()
+        self.set_page(0)
+        layout = self.get_layout()
+        shape = layout.shape
+        dtype = layout.dtype
+        arr = self._output_array(out, (len(offsets),) + shape, dtype)
+
+        def read_page(tiff, page):
+            if page:
+                tiff.SetSubDirectory(offsets[page])
+            page_layout = tiff.get_layout()
+            if page_layout.shape != shape or page_layout.dtype != dtype:
+                raise ValueError(
+                    "Image %d has shape %s and dtype %s, expected %s and %s"
+                    % (page, page_layout.shape, np.dtype(page_layout.dtype),
+                       shape, np.dtype(dtype)))
+            TIFF.read_image(tiff, verbose, out=arr[page])
 
-        layer = 0
-        while True:
-            pos = 0
-            elem = None
-            datal = arr.ctypes.data + layer * layer_size
-            for strip in range(self.NumberOfStrips()):
-                if elem is None:
-                    elem = self.ReadEncodedStrip(strip, datal + pos, layer_size)
-                elif elem:
-                    elem = self.ReadEncodedStrip(strip, datal + pos,
-                                                 min(layer_size - pos, elem))
-                pos += elem
-            if self.LastDirectory():
-                break
-            self.ReadDirectory()
-            layer += 1
-        self.SetDirectory(0)
+        try:
+            self._map_workers(read_page, range(len(offsets)), workers)
+        finally:
+            self.set_page(0)
         return arr
 
 
@@ -1883,6 +4134,9 @@ libtiff.TIFFCurrentTile.argtypes = [TIFF]
 libtiff.TIFFCurrentDirectory.restype = c_tdir_t
 libtiff.TIFFCurrentDirectory.argtypes = [TIFF]
 
+libtiff.TIFFCurrentDirOffset.restype = ctypes.c_uint64
+libtiff.TIFFCurrentDirOffset.argtypes = [TIFF]
+
 libtiff.TIFFLastDirectory.restype = ctypes.c_int
 libtiff.TIFFLastDirectory.argtypes = [TIFF]
 
@@ -1910,6 +4164,15 @@ libtiff.TIFFIsTiled.argtypes = [TIFF]
 libtiff.TIFFIsByteSwapped.restype = ctypes.c_int
 libtiff.TIFFIsByteSwapped.argtypes = [TIFF]
 
+libtiff.TIFFClientOpen.restype = TIFF
+libtiff.TIFFClientOpen.argtypes = [
+    ctypes.c_char_p, ctypes.c_char_p, c_thandle_t, _TIFFReadWriteProc,
+    _TIFFReadWriteProc, _TIFFSeekProc, _TIFFCloseProc, _TIFFSizeProc,
+    _TIFFMapFileProc, _TIFFUnmapFileProc]
+
+libtiff.TIFFIsBigTIFF.restype = ctypes.c_int
+libtiff.TIFFIsBigTIFF.argtypes = [TIFF]
+
 libtiff.TIFFIsUpSampled.restype = ctypes.c_int
 libtiff.TIFFIsUpSampled.argtypes = [TIFF]
 
@@ -1958,6 +4221,36 @@ libtiff.TIFFStripSize.argtypes = [TIFF]
 libtiff.TIFFRawStripSize.restype = c_tsize_t
 libtiff.TIFFRawStripSize.argtypes = [TIFF, c_tstrip_t]
 
+# Field enumeration and description
+libtiff.TIFFGetTagListCount.restype = ctypes.c_int
+libtiff.TIFFGetTagListCount.argtypes = [TIFF]
+
+libtiff.TIFFGetTagListEntry.restype = ctypes.c_uint32
+libtiff.TIFFGetTagListEntry.argtypes = [TIFF, ctypes.c_int]
+
+libtiff.TIFFFindField.restype = ctypes.c_void_p
+libtiff.TIFFFindField.argtypes = [TIFF, ctypes.c_uint32, ctypes.c_int]
+
+libtiff.TIFFFieldWithTag.restype = ctypes.c_void_p
+libtiff.TIFFFieldWithTag.argtypes = [TIFF, ctypes.c_uint32]
+
+if hasattr(libtiff, 'TIFFFieldName'):  # libtiff >= 4.1
+    libtiff.TIFFFieldName.restype = ctypes.c_char_p
+    libtiff.TIFFFieldName.argtypes = [ctypes.c_void_p]
+
+    libtiff.TIFFFieldDataType.restype = ctypes.c_int
+    libtiff.TIFFFieldDataType.argtypes = [ctypes.c_void_p]
+
+    libtiff.TIFFFieldPassCount.restype = ctypes.c_int
+    libtiff.TIFFFieldPassCount.argtypes = [ctypes.c_void_p]
+
+    libtiff.TIFFFieldReadCount.restype = ctypes.c_int
+    libtiff.TIFFFieldReadCount.argtypes = [ctypes.c_void_p]
+
+if hasattr(libtiff, 'TIFFFieldSetGetSize'):  # libtiff >= 4.4
+    libtiff.TIFFFieldSetGetSize.restype = ctypes.c_int
+    libtiff.TIFFFieldSetGetSize.argtypes = [ctypes.c_void_p]
+
 # For adding custom tags (must be void pointer otherwise callback seg faults)
 libtiff.TIFFMergeFieldInfo.restype = ctypes.c_int32
 libtiff.TIFFMergeFieldInfo.argtypes = [ctypes.c_void_p, ctypes.c_void_p,
@@ -1995,9 +4288,8 @@ libtiff.TIFFWriteTile.argtypes = [TIFF, c_tdata_t, ctypes.c_uint32,
                                   ctypes.c_uint32, ctypes.c_uint32,
                                   c_tsample_t]
 
-libtiff.TIFFReadEncodedTile.restype = ctypes.c_int
-libtiff.TIFFReadEncodedTile.argtypes = [TIFF, ctypes.c_ulong, ctypes.c_char_p,
-                                        ctypes.c_ulong]
+libtiff.TIFFReadEncodedTile.restype = c_tsize_t
+libtiff.TIFFReadEncodedTile.argtypes = [TIFF, c_ttile_t, c_tdata_t, c_tsize_t]
 
 libtiff.TIFFReadRawTile.restype = c_tsize_t
 libtiff.TIFFReadRawTile.argtypes = [TIFF, c_ttile_t, c_tdata_t, c_tsize_t]
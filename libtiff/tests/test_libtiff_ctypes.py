@@ -3,7 +3,10 @@ import numpy as np
 import pytest
 import time
 from libtiff import TIFFimage
+import io
+import mmap
 import os
+import struct
 import sys
 
 lt = pytest.importorskip('libtiff.libtiff_ctypes')
@@ -133,6 +136,375 @@ def test_tile_write(tmp_path):
     print("Tile Write: SUCCESS")
 
 
+def test_write_tiles_workers(tmp_path):
+    data = np.arange(50 * 70 * 3, dtype=np.uint16).reshape(3, 50, 70) % 251
+    for compression, mode in [('adobe_deflate', 'w'), ('lzw', 'w'),
+                              ('lzw', 'wb'), ('packbits', 'w')]:
+        written = {}
+        content = {}
+        for workers in (None, 2):
+            fn = tmp_path / ("workers%s.tif" % (workers,))
+            tiff = lt.TIFF.open(fn, mode)
+            written[workers] = tiff.write_tiles(data, 32, 16,
+                                                compression=compression,
+                                                workers=workers)
+            tiff.close()
+            tiff = lt.TIFF.open(fn)
+            assert tiff.GetField('Compression') == \
+                lt.TIFF._fix_compression(compression)
+            assert np.array_equal(tiff.read_image(), data)
+            tiff.close()
+            content[workers] = fn.read_bytes()
+        assert written[None] == written[2]
+        if compression != 'adobe_deflate':
+            # encoded by libtiff in both cases
+            assert content[None] == content[2]
+
+    tiff = lt.TIFF.open(tmp_path / "workers_none.tif", "w")
+    with pytest.warns(UserWarning, match="workers=2 is ignored"):
+        tiff.write_tiles(data[0], 32, 16, workers=2)
+    tiff.close()
+
+
+def test_write_image_strips(tmp_path):
+    gray = np.arange(100 * 30, dtype=np.uint16).reshape(100, 30)
+    rgb = np.arange(3 * 40 * 20, dtype=np.uint8).reshape(3, 40, 20)
+    fn = tmp_path / "strips.tif"
+    tiff = lt.TIFF.open(fn, "w")
+    tiff.write_image(gray, rows_per_strip=16)
+    tiff.write_image(gray, compression='adobe_deflate', strip_bytes=1000,
+                     workers=2)
+    tiff.write_image(rgb, compression='deflate', write_rgb=True,
+                     rows_per_strip=8, workers=2)
+    tiff.write_image(gray, compression='lzw', rows_per_strip=16, workers=2)
+    with pytest.raises(ValueError):
+        tiff.write_image(gray, rows_per_strip=16, strip_bytes=1000)
+    tiff.close()
+
+    tiff = lt.TIFF.open(fn)
+    assert tiff.GetField('RowsPerStrip') == 16
+    assert tiff.NumberOfStrips() == 7
+    assert np.array_equal(tiff.read_image(), gray)
+    tiff.ReadDirectory()
+    assert tiff.GetField('RowsPerStrip') == 1000 // 60
+    assert np.array_equal(tiff.read_image(), gray)
+    tiff.ReadDirectory()
+    assert tiff.NumberOfStrips() == 3 * 5
+    assert np.array_equal(tiff.read_image(), rgb)
+    tiff.ReadDirectory()
+    assert tiff.GetField('Predictor') == lt.PREDICTOR_HORIZONTAL
+    chunks = [bytes(data) for _, data in tiff.iter_raw_chunks()]
+    assert np.array_equal(tiff.read_image(), gray)
+    tiff.close()
+    # the strips encoded by the threads are those of libtiff
+    tiff = lt.TIFF.open(tmp_path / "strips_lzw.tif", "w")
+    tiff.write_image(gray, compression='lzw', rows_per_strip=16)
+    tiff.close()
+    tiff = lt.TIFF.open(tmp_path / "strips_lzw.tif")
+    assert [bytes(data) for _, data in tiff.iter_raw_chunks()] == chunks
+    tiff.close()
+
+
+def test_begin_image(tmp_path):
+    gray = np.arange(100 * 30, dtype=np.uint16).reshape(100, 30)
+    rgb = np.arange(50 * 20 * 3, dtype=np.uint8).reshape(50, 20, 3)
+    fn = tmp_path / "stream.tif"
+    tiff = lt.TIFF.open(fn, "w")
+    writer = tiff.begin_image(gray.shape, gray.dtype, compression='lzw',
+                              rows_per_strip=16)
+    for start, stop in [(0, 5), (5, 40), (40, 48), (48, 100)]:
+        writer.write_rows(gray[start:stop])
+    with pytest.raises(ValueError):
+        writer.write_rows(gray[:1])
+    writer.close()
+    with tiff.begin_image(rgb.shape, rgb.dtype, strip_bytes=600) as writer:
+        for row in rgb:
+            writer.write_rows(row[None])
+    writer = tiff.begin_image(gray.shape, gray.dtype)
+    with pytest.raises(ValueError):
+        writer.write_rows(gray[:, :10])
+    writer.write_rows(gray[:10])
+    with pytest.raises(ValueError):
+        writer.close()
+    tiff.close()
+
+    tiff = lt.TIFF.open(fn)
+    assert tiff.GetField('RowsPerStrip') == 16
+    assert tiff.NumberOfStrips() == 7
+    assert np.array_equal(tiff.read_image(), gray)
+    tiff.ReadDirectory()
+    assert tiff.GetField('RowsPerStrip') == 10
+    assert np.array_equal(tiff.read_image(), rgb)
+    tiff.close()
+
+
+def test_bigtiff(tmp_path, monkeypatch):
+    monkeypatch.setattr(lt, '_BIGTIFF_THRESHOLD', 1000)
+    data = np.arange(40 * 50, dtype=np.uint16).reshape(40, 50)
+
+    tiff = lt.TIFF.open(tmp_path / "hint.tif", "w", size_hint=2000)
+    assert tiff.IsBigTIFF()
+    tiff.close()
+    tiff = lt.TIFF.open(tmp_path / "hint4.tif", "w4", size_hint=2000)
+    assert not tiff.IsBigTIFF()
+    tiff.close()
+
+    fn = tmp_path / "auto.tif"
+    tiff = lt.TIFF.open(fn, "w")
+    assert not tiff.IsBigTIFF()
+    tiff.SetField('ImageDescription', b'big')
+    tiff.write_image(data, rows_per_strip=8)
+    assert tiff.IsBigTIFF()
+    tiff.write_image(data)
+    tiff.close()
+    tiff = lt.TIFF.open(fn)
+    assert tiff.IsBigTIFF()
+    assert tiff.GetField('ImageDescription') == b'big'
+    assert tiff.GetField('StripOffsets').dtype == np.uint64
+    assert np.array_equal(tiff.read_image(), data)
+    tiff.ReadDirectory()
+    assert np.array_equal(tiff.read_image(), data)
+    tiff.close()
+
+    # the tags set before the switch are kept
+    fn = tmp_path / "palette.tif"
+    colormap = [np.arange(256, dtype=np.uint16) * k for k in (1, 2, 3)]
+    palette = np.arange(40 * 50, dtype=np.uint8).reshape(40, 50)
+    tiff = lt.TIFF.open(fn, "w")
+    tiff.SetField('ImageWidth', 50)
+    tiff.SetField('ImageLength', 40)
+    tiff.SetField('BitsPerSample', 8)
+    tiff.SetField('RowsPerStrip', 40)
+    tiff.SetField('Photometric', lt.PHOTOMETRIC_PALETTE)
+    tiff.SetField('PlanarConfig', lt.PLANARCONFIG_SEPARATE)
+    tiff.SetField('ColorMap', colormap)
+    tiff._ensure_bigtiff(2000)
+    assert tiff.IsBigTIFF()
+    tiff.WriteEncodedStrip(0, palette.ctypes.data, palette.nbytes)
+    tiff.close()
+    tiff = lt.TIFF.open(fn)
+    assert tiff.IsBigTIFF()
+    assert tiff.GetField('Photometric') == lt.PHOTOMETRIC_PALETTE
+    assert tiff.GetField('PlanarConfig') == lt.PLANARCONFIG_SEPARATE
+    for expected, channel in zip(colormap, tiff.GetField('ColorMap')):
+        assert np.array_equal(channel, expected)
+    assert np.array_equal(tiff.read_image(), palette)
+    tiff.close()
+
+    # only an empty file can be switched
+    tiff = lt.TIFF.open(tmp_path / "classic.tif", "w")
+    tiff.write_image(data[:10])
+    tiff.write_image(data)
+    assert not tiff.IsBigTIFF()
+    tiff.close()
+
+
+def test_open_buffer(tmp_path):
+    data = np.arange(60 * 40, dtype=np.uint16).reshape(60, 40)
+    buffer = io.BytesIO()
+    tiff = lt.TIFF.open_buffer(buffer, "w")
+    tiff.write_image(data, rows_per_strip=8)
+    tiff.write_image(data * 2, compression='lzw')
+    tiff.close()
+    content = buffer.getvalue()
+
+    fn = tmp_path / "buffer.tif"
+    fn.write_bytes(content)
+    tiff = lt.TIFF.open(fn)
+    assert np.array_equal(tiff.read_image(), data)
+    tiff.close()
+
+    tiff = lt.TIFF.open_bytes(content)
+    assert tiff.FileName() == b'<memory>'
+    assert np.array_equal(tiff.read_image(workers=2), data)
+    # uncompressed images are views of the buffer
+    arr = tiff.read_image(use_memmap=True)
+    assert not arr.flags.writeable
+    assert np.array_equal(arr, data)
+    images = list(tiff.iter_images(prefetch=1))
+    assert np.array_equal(images[1], data * 2)
+    tiff.close()
+
+    with open(fn, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    tiff = lt.TIFF.open_bytes(mapped)
+    assert np.array_equal(tiff.read_image(), data)
+    tiff.close()
+    mapped.close()
+
+    tiff = lt.TIFF3D.open_buffer(buffer)
+    assert isinstance(tiff, lt.TIFF3D)
+    assert np.array_equal(tiff.read_image(), [data, data * 2])
+    tiff.close()
+
+    with pytest.raises(TypeError):
+        lt.TIFF.open_bytes(b'not a tiff file')
+    with pytest.raises(ValueError):
+        lt.TIFF.open_buffer(content, "w")
+
+
+def test_write_pages(tmp_path, monkeypatch):
+    frames = np.arange(5 * 20 * 30, dtype=np.int16).reshape(5, 20, 30)
+    fn = tmp_path / "pages.tif"
+    tiff = lt.TIFF.open(fn, "w")
+    template = {'ImageDescription': b'camera', 'XResolution': 2.5}
+    assert tiff.write_pages(iter(frames), template=template,
+                            compression='lzw', rows_per_strip=8) == 5
+    rgb = np.zeros((20, 30, 3), np.uint8)
+    assert tiff.write_pages([rgb, rgb + 1]) == 2
+    with pytest.raises(ValueError):
+        tiff.write_pages([frames[0], frames[0, :10]])
+    tiff.close()
+
+    tiff = lt.TIFF.open(fn)
+    for index, frame in enumerate(frames):
+        tiff.SetDirectory(index)
+        assert tiff.GetField('ImageDescription') == b'camera'
+        assert tiff.GetField('XResolution') == 2.5
+        assert tiff.GetField('Compression') == lt.COMPRESSION_LZW
+        assert tiff.NumberOfStrips() == 3
+        assert np.array_equal(tiff.read_image(), frame)
+    tiff.SetDirectory(6)
+    assert np.array_equal(tiff.read_image(), rgb + 1)
+    tiff.close()
+
+    # the size of all the pages is used to switch to BigTIFF
+    monkeypatch.setattr(lt, '_BIGTIFF_THRESHOLD', frames.nbytes - 1)
+    tiff = lt.TIFF.open(tmp_path / "big_pages.tif", "w")
+    assert tiff.write_pages(list(frames)) == 5
+    assert tiff.IsBigTIFF()
+    tiff.close()
+
+
+def test_open_append(tmp_path):
+    frames = np.arange(6 * 10 * 12, dtype=np.uint16).reshape(6, 10, 12)
+    fn = tmp_path / "append.tif"
+    tiff = lt.TIFF.open_append(fn)
+    tiff.write_image(frames[0])
+    tiff.close()
+    for frame in frames[1:3]:
+        tiff = lt.TIFF.open_append(fn)
+        tiff.write_image(frame)
+        tiff.close()
+    with open(str(fn) + '.lastifd') as f:
+        offset, size, mtime = map(int, f.read().split())
+    assert (size, mtime) == (os.stat(fn).st_size, os.stat(fn).st_mtime_ns)
+    tiff = lt.TIFF.open(fn)
+    assert list(tiff._directory_offsets())[-1] == offset
+    tiff.close()
+
+    # a sidecar that does not point to a directory is ignored
+    with open(str(fn) + '.lastifd', 'w') as f:
+        f.write('%d %d %d\n' % (8, size, mtime))
+    tiff = lt.TIFF.open_append(fn)
+    tiff.write_image(frames[3])
+    tiff.close()
+    tiff = lt.TIFF3D.open(fn)
+    assert np.array_equal(tiff.read_image(), frames[:4])
+    tiff.close()
+
+    # the directories are checked while following the chain
+    for count, field_type in [(1, 3), (0, 3), (1, 99), (2, 3)]:
+        fileobj = io.BytesIO(b''.join([
+            b'II*\x00', struct.pack('<I', 8), struct.pack('<H', count),
+            struct.pack('<HHII', 256, field_type, 1, 12), b'\x00' * 4]))
+        if count == 1 and field_type == 3:
+            assert lt._last_directory_offset(fileobj, '<', False, 8) == 8
+        else:
+            with pytest.raises(ValueError):
+                lt._last_directory_offset(fileobj, '<', False, 8)
+
+    # the sidecar is ignored once the file was modified by other means
+    tiff = lt.TIFF.open(fn, "a")
+    tiff.write_image(frames[4])
+    tiff.close()
+    tiff = lt.TIFF.open_append(fn)
+    tiff.write_pages(frames[5:])
+    tiff.close()
+    tiff = lt.TIFF3D.open(fn)
+    assert np.array_equal(tiff.read_image(), frames)
+    tiff.close()
+
+    fn = tmp_path / "append_big.tif"
+    lt.TIFF.open(fn, "w8").close()
+    for frame in frames[:3]:
+        tiff = lt.TIFF.open_append(fn, sidecar=False)
+        tiff.write_image(frame)
+        tiff.close()
+    assert not os.path.exists(str(fn) + '.lastifd')
+    tiff = lt.TIFF3D.open(fn)
+    assert tiff.IsBigTIFF()
+    assert np.array_equal(tiff.read_image(), frames[:3])
+    tiff.close()
+
+
+def test_import(tmp_path, monkeypatch):
+    import subprocess
+    package_dir = os.path.dirname(lt.__file__)
+    before = sorted(name for name in os.listdir(package_dir)
+                    if name.endswith('.py'))
+    # the module is imported from another directory, in a new interpreter
+    code = ("import os, sys, time\n"
+            "import numpy\n"
+            "def chdir(path):\n"
+            "    raise AssertionError('chdir(%r) on import' % (path,))\n"
+            "os.chdir = chdir\n"
+            "modules = set(sys.modules)\n"
+            "start = time.perf_counter()\n"
+            "import libtiff.libtiff_ctypes\n"
+            "print(time.perf_counter() - start)\n"
+            "print(' '.join(sorted(set(sys.modules) - modules)))\n")
+    env = dict(os.environ)
+    paths = [os.path.dirname(package_dir)]
+    paths.extend(env.get('PYTHONPATH', '').split(os.pathsep))
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    result = subprocess.run([sys.executable, '-c', code], cwd=str(tmp_path),
+                            env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    duration, imported = result.stdout.split('\n', 1)
+    print("Import of libtiff.libtiff_ctypes: %.1f ms"
+          % (float(duration) * 1e3))
+    # find_library, which may run ldconfig or a compiler, is not needed
+    # when the library has one of the usual names
+    if lt.libtiff._name in ('libtiff.so.6', 'libtiff.so.5', 'libtiff.so',
+                            'libtiff.6.dylib', 'libtiff.5.dylib',
+                            'libtiff.dylib'):
+        assert 'ctypes.util' not in imported.split()
+        assert 'subprocess' not in imported.split()
+    assert os.listdir(tmp_path) == []
+    assert sorted(name for name in os.listdir(package_dir)
+                  if name.endswith('.py')) == before
+
+    # versions without a module use the closest one, with a warning
+    versions = lt._shipped_tiff_h_versions()
+    monkeypatch.setattr(lt, '_find_tiff_h', lambda path: None)
+    newest = lt._load_tiff_h(versions[-1])
+    with pytest.warns(UserWarning, match="No tiff.h found"):
+        assert lt._load_tiff_h((99, 0, 0)) == newest
+    with pytest.warns(UserWarning):
+        assert lt._load_tiff_h(versions[0][:2] + (99,)) == lt._load_tiff_h(
+            [v for v in versions if v[:2] == versions[0][:2]][-1])
+    with pytest.warns(UserWarning):
+        assert lt._load_tiff_h((1, 0, 0)) == lt._load_tiff_h(versions[0])
+    monkeypatch.undo()
+    # or the header installed with the library or given by
+    # TIFF_HEADER_PATH, parsed in memory
+    header = tmp_path / "include" / "tiff.h"
+    header.parent.mkdir()
+    header.write_text("#define TIFFTAG_IMAGEWIDTH 256 /* width */\n"
+                      "#define TIFFTAG_LONG \\\n    (1 << 4)\n")
+    monkeypatch.delenv('TIFF_HEADER_PATH', raising=False)
+    (tmp_path / "lib").mkdir()
+    library = str(tmp_path / "lib" / "libtiff.so")
+    assert lt._find_tiff_h(library) == os.path.join(
+        str(tmp_path), "lib", "..", "include", "tiff.h")
+    expected = {'TIFFTAG_IMAGEWIDTH': 256, 'TIFFTAG_LONG': 16}
+    assert lt._load_tiff_h((99, 0, 0), library) == expected
+    monkeypatch.setenv('TIFF_HEADER_PATH', str(header))
+    assert lt._load_tiff_h((99, 0, 0)) == expected
+    assert sorted(os.listdir(tmp_path)) == ["include", "lib"]
+
+
 def test_tile_read(tmp_path):
     test_tile_write(tmp_path)  # Create file first
 
@@ -349,6 +721,556 @@ def test_read_one_tile(tmp_path):
     assert tile.shape == (3, 388, 440), repr(tile.shape)
 
 
+def test_read_region(tmp_path):
+    test_tile_write(tmp_path)  # Create file first
+
+    filename = tmp_path / "libtiff_test_tile_write.tiff"
+    tiff = lt.TIFF.open(filename, "r")
+
+    # second image, 3000 x 2500
+    tiff.SetDirectory(1)
+    expected = np.tile(list(range(500)), (2500, 6)).astype(np.uint8)
+    for x, y, w, h in [(0, 0, 10, 10), (500, 520, 30, 20),
+                       (2990, 2490, 10, 10), (0, 0, 3000, 2500)]:
+        region = tiff.read_region(x, y, w, h)
+        np.testing.assert_array_equal(region, expected[y:y + h, x:x + w])
+
+    # RGB image, PLANARCONFIG_CONTIG
+    tiff.SetDirectory(2)
+    expected = np.array(range(2500 * 3000 * 3)).reshape(
+        2500, 3000, 3).astype(np.uint8)
+    region = tiff.read_region(1020, 1050, 100, 20)
+    np.testing.assert_array_equal(region, expected[1050:1070, 1020:1120])
+
+    # RGB image, PLANARCONFIG_SEPARATE
+    tiff.SetDirectory(3)
+    expected = np.array(range(2500 * 3000 * 3)).reshape(
+        3, 2500, 3000).astype(np.uint8)
+    region = tiff.read_region(1020, 1050, 100, 20)
+    np.testing.assert_array_equal(region, expected[:, 1050:1070, 1020:1120])
+
+    # Grayscale image with 3 depths
+    tiff.SetDirectory(4)
+    region = tiff.read_region(2900, 2400, 100, 100)
+    np.testing.assert_array_equal(region, expected[:, 2400:, 2900:])
+
+    with pytest.raises(ValueError):
+        tiff.read_region(2990, 0, 20, 10)
+    with pytest.raises(ValueError):
+        tiff.read_region(0, -1, 10, 10)
+
+
+def _write_strips(tiff, arr, rows_per_strip, compression=lt.COMPRESSION_LZW,
+                  planar_config=lt.PLANARCONFIG_CONTIG):
+    # Write one directory made of several strips of rows_per_strip rows
+    if planar_config == lt.PLANARCONFIG_SEPARATE:
+        samples_pp, height, width = arr.shape
+        planes = arr
+    else:
+        height, width = arr.shape[:2]
+        samples_pp = arr.shape[2] if arr.ndim == 3 else 1
+        planes = [arr]
+    tiff.SetField('ImageWidth', width)
+    tiff.SetField('ImageLength', height)
+    tiff.SetField('BitsPerSample', arr.itemsize * 8)
+    tiff.SetField('SamplesPerPixel', samples_pp)
+    tiff.SetField('PlanarConfig', planar_config)
+    tiff.SetField('Photometric',
+                  lt.PHOTOMETRIC_RGB if samples_pp == 3 else lt.PHOTOMETRIC_MINISBLACK)
+    tiff.SetField('Compression', compression)
+    tiff.SetField('RowsPerStrip', rows_per_strip)
+    strip = 0
+    for plane in planes:
+        for y in range(0, height, rows_per_strip):
+            buf = np.ascontiguousarray(plane[y:y + rows_per_strip])
+            tiff.WriteEncodedStrip(strip, buf.ctypes.data, buf.nbytes)
+            strip += 1
+    tiff.WriteDirectory()
+
+
+def test_read_rows(tmp_path):
+    filename = tmp_path / "libtiff_test_read_rows.tiff"
+    gray = np.arange(100 * 30, dtype=np.uint16).reshape(100, 30)
+    rgb = np.arange(100 * 30 * 3, dtype=np.uint8).reshape(100, 30, 3)
+    tiff = lt.TIFF.open(filename, mode="w")
+    _write_strips(tiff, gray, 16)
+    _write_strips(tiff, rgb, 7)
+    _write_strips(tiff, rgb.transpose(2, 0, 1), 9,
+                  planar_config=lt.PLANARCONFIG_SEPARATE)
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename, mode="r")
+    for start, stop in [(0, 100), (0, 1), (16, 32), (5, 50), (99, 100)]:
+        np.testing.assert_array_equal(tiff.read_rows(start, stop),
+                                      gray[start:stop])
+    out = np.empty((20, 30), dtype=np.uint16)
+    assert tiff.read_rows(10, 30, out=out) is out
+    np.testing.assert_array_equal(out, gray[10:30])
+    np.testing.assert_array_equal(tiff.read_region(3, 20, 10, 50),
+                                  gray[20:70, 3:13])
+    with pytest.raises(ValueError):
+        tiff.read_rows(50, 50)
+    with pytest.raises(ValueError):
+        tiff.read_rows(90, 101)
+
+    tiff.SetDirectory(1)
+    np.testing.assert_array_equal(tiff.read_rows(13, 45), rgb[13:45])
+    tiff.SetDirectory(2)
+    np.testing.assert_array_equal(tiff.read_rows(13, 45),
+                                  rgb[13:45].transpose(2, 0, 1))
+    np.testing.assert_array_equal(tiff.read_region(3, 20, 10, 50),
+                                  rgb[20:70, 3:13].transpose(2, 0, 1))
+    tiff.close()
+
+
+def test_read_image_workers(tmp_path):
+    filename = tmp_path / 'libtiff_test_workers.tiff'
+    gray = (np.arange(301 * 203) % 251).astype(np.uint16).reshape(301, 203)
+    rgb = (np.arange(301 * 203 * 3) % 253).astype(np.uint8).reshape(301, 203, 3)
+    tiff = lt.TIFF.open(filename, mode='w')
+    _write_strips(tiff, gray, 16)
+    _write_strips(tiff, rgb, 10)
+    _write_strips(tiff, np.ascontiguousarray(rgb.transpose(2, 0, 1)), 7,
+                  planar_config=lt.PLANARCONFIG_SEPARATE)
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    for expected in [gray, rgb, rgb.transpose(2, 0, 1)]:
+        np.testing.assert_array_equal(tiff.read_image(), expected)
+        np.testing.assert_array_equal(tiff.read_image(workers=4), expected)
+        tiff.ReadDirectory()
+    tiff.close()
+
+
+def test_read_tiles_workers(tmp_path):
+    test_tile_write(tmp_path)  # Create file first
+
+    tiff = lt.TIFF.open(tmp_path / "libtiff_test_tile_write.tiff", "r")
+    for directory in range(5):
+        tiff.SetDirectory(directory)
+        np.testing.assert_array_equal(tiff.read_image(workers=3),
+                                      tiff.read_image())
+
+
+def test_read_tiles_full_width(tmp_path):
+    # Tiles covering whole rows are decoded straight into the output
+    filename = tmp_path / "libtiff_test_full_width_tiles.tiff"
+    gray = (np.arange(100 * 256) % 251).astype(np.uint8).reshape(100, 256)
+    rgb = (np.arange(100 * 256 * 3) % 253).astype(np.uint16).reshape(100, 256, 3)
+    tiff = lt.TIFF.open(filename, "w")
+    tiff.write_tiles(gray, 256, 32, compression='lzw')
+    tiff.write_tiles(rgb, 256, 16, write_rgb=True)
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename, "r")
+    np.testing.assert_array_equal(tiff.read_image(), gray)
+    tiff.ReadDirectory()
+    np.testing.assert_array_equal(tiff.read_image(), rgb)
+
+
+def test_read_image_out(tmp_path):
+    filename = tmp_path / 'libtiff_test_out.tiff'
+    arr = (np.arange(4 * 30 * 20) % 251).astype(np.uint16).reshape(4, 30, 20)
+    tiff = lt.TIFF.open(filename, mode='w')
+    for page in arr:
+        tiff.write_image(page)
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    out = np.memmap(tmp_path / 'out.raw', np.uint16, 'w+', shape=(30, 20))
+    assert tiff.read_image(out=out) is out
+    np.testing.assert_array_equal(out, arr[0])
+    with pytest.raises(ValueError):
+        tiff.read_image(out=np.empty((30, 20), np.uint8))
+    with pytest.raises(ValueError):
+        tiff.read_image(out=np.empty((20, 30), np.uint16).T)
+
+    images = list(tiff.iter_images(out=out))
+    assert all(image is out for image in images)
+    np.testing.assert_array_equal(out, arr[-1])
+
+    first = None
+    for i, image in enumerate(tiff.iter_images(reuse=True)):
+        if first is None:
+            first = image
+        assert image is first
+        np.testing.assert_array_equal(image, arr[i])
+    tiff.close()
+
+    tiff = lt.TIFF3D.open(filename)
+    out = np.empty(arr.shape, arr.dtype)
+    assert tiff.read_image(out=out) is out
+    np.testing.assert_array_equal(out, arr)
+    tiff.close()
+
+
+def test_read_image_memmap(tmp_path):
+    filename = tmp_path / 'libtiff_test_memmap.tiff'
+    gray = (np.arange(50 * 32) % 251).astype(np.uint16).reshape(50, 32)
+    rgb = (np.arange(50 * 32 * 3) % 251).astype(np.uint8).reshape(50, 32, 3)
+    tiff = lt.TIFF.open(filename, mode='w')
+    _write_strips(tiff, gray, 7, compression=lt.COMPRESSION_NONE)
+    _write_strips(tiff, rgb.transpose(2, 0, 1), 16,
+                  compression=lt.COMPRESSION_NONE,
+                  planar_config=lt.PLANARCONFIG_SEPARATE)
+    tiff.write_tiles(gray, 32, 16)
+    _write_strips(tiff, gray, 7)
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    for page, expected in enumerate([gray, rgb.transpose(2, 0, 1), gray]):
+        tiff.SetDirectory(page)
+        image = tiff.read_image(use_memmap=True)
+        assert isinstance(image, np.memmap)
+        assert not image.flags.writeable
+        np.testing.assert_array_equal(image, expected)
+    # compressed data is decoded
+    tiff.SetDirectory(3)
+    image = tiff.read_image(use_memmap=True)
+    assert not isinstance(image, np.memmap)
+    np.testing.assert_array_equal(image, gray)
+    with pytest.raises(ValueError):
+        tiff.read_image(use_memmap=True, out=np.empty_like(gray))
+    tiff.close()
+
+
+def test_raw_chunks(tmp_path):
+    filename = tmp_path / 'libtiff_test_raw_chunks.tiff'
+    gray = (np.arange(50 * 32) % 251).astype(np.uint16).reshape(50, 32)
+    tiff = lt.TIFF.open(filename, mode='w')
+    _write_strips(tiff, gray, 7)
+    tiff.write_tiles(gray, 16, 16, compression='deflate')
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    raw = open(filename, 'rb').read()
+    copy_name = tmp_path / 'libtiff_test_raw_chunks_copy.tiff'
+    copy = lt.TIFF.open(copy_name, mode='w')
+    for page in range(2):
+        tiff.SetDirectory(page)
+        offsets = tiff.GetField('StripOffsets')
+        chunks = [(index, bytes(data))
+                  for index, data in tiff.iter_raw_chunks()]
+        assert len(chunks) == len(offsets) == 8
+        for (_index, data), offset in zip(chunks, offsets):
+            assert data == raw[offset:offset + len(data)]
+
+        for tag in ['ImageWidth', 'ImageLength', 'BitsPerSample',
+                    'Compression', 'Predictor', 'Photometric', 'RowsPerStrip',
+                    'TileWidth', 'TileLength', 'SampleFormat']:
+            value = tiff.GetField(tag)
+            if value is not None:
+                copy.SetField(tag, value)
+        assert copy.write_raw_chunks(chunks) == sum(len(d) for _, d in chunks)
+        copy.WriteDirectory()
+    copy.close()
+    tiff.close()
+
+    copy = lt.TIFF.open(copy_name)
+    np.testing.assert_array_equal(copy.read_image(), gray)
+    copy.ReadDirectory()
+    np.testing.assert_array_equal(copy.read_image(), gray)
+    copy.close()
+
+
+def test_tiff3d_read_image(tmp_path):
+    filename = tmp_path / 'libtiff_test_tiff3d.tiff'
+    arr = (np.arange(6 * 40 * 30) % 251).astype(np.uint16).reshape(6, 40, 30)
+    tiff = lt.TIFF.open(filename, mode='w')
+    tiff.write_image(arr, compression='lzw')
+    tiff.close()
+
+    tiff = lt.TIFF3D.open(filename)
+    np.testing.assert_array_equal(tiff.read_image(), arr)
+    np.testing.assert_array_equal(tiff.read_image(workers=3), arr)
+    assert tiff.CurrentDirectory().value == 0
+    tiff.close()
+
+    # tiled RGB pages
+    filename = tmp_path / 'libtiff_test_tiff3d_rgb.tiff'
+    rgb = (np.arange(3 * 40 * 30 * 3) % 251).astype(np.uint8)
+    rgb = rgb.reshape(3, 40, 30, 3)
+    tiff = lt.TIFF.open(filename, mode='w')
+    for page in rgb:
+        tiff.write_tiles(page, 16, 16, write_rgb=True)
+    tiff.close()
+
+    tiff = lt.TIFF3D.open(filename)
+    np.testing.assert_array_equal(tiff.read_image(workers=2), rgb)
+    tiff.close()
+
+    # the last page does not match the first one
+    tiff = lt.TIFF.open(filename, mode='a')
+    tiff.write_image(rgb[0, :, :, 0])
+    tiff.close()
+    tiff = lt.TIFF3D.open(filename)
+    with pytest.raises(ValueError):
+        tiff.read_image()
+    tiff.close()
+
+
+def test_iter_images_prefetch(tmp_path):
+    filename = tmp_path / 'libtiff_test_prefetch.tiff'
+    arr = (np.arange(5 * 30 * 20) % 251).astype(np.uint8).reshape(5, 30, 20)
+    tiff = lt.TIFF.open(filename, mode='w')
+    for page in arr:
+        tiff.write_image(page, compression='lzw')
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    for i, image in enumerate(tiff.iter_images(prefetch=2)):
+        np.testing.assert_array_equal(image, arr[i])
+        assert tiff.CurrentDirectory().value == i
+    assert i == 4
+    assert tiff.CurrentDirectory().value == 0
+
+    # stopping early does not leave the decoding thread blocked
+    for i, _image in enumerate(tiff.iter_images(prefetch=1)):
+        if i == 1:
+            break
+    assert tiff.CurrentDirectory().value == 1
+    tiff.SetDirectory(0)
+    np.testing.assert_array_equal(
+        np.array(list(tiff.iter_images(prefetch=3))), arr)
+
+    with pytest.raises(ValueError):
+        next(tiff.iter_images(prefetch=2, reuse=True))
+    tiff.close()
+
+
+def test_pages(tmp_path):
+    filename = tmp_path / 'libtiff_test_pages.tiff'
+    arr = (np.arange(6 * 8 * 5) % 251).astype(np.uint8).reshape(6, 8, 5)
+    tiff = lt.TIFF.open(filename, mode='w')
+    for page in arr:
+        tiff.write_image(page)
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    assert len(tiff.pages) == 6
+    for i in [3, 0, 5, -1, 2]:
+        np.testing.assert_array_equal(tiff.pages[i], arr[i])
+        assert tiff.CurrentDirectory().value == i % 6
+    assert len(tiff.pages[1:4]) == 3
+    with pytest.raises(IndexError):
+        tiff.pages[6]
+    np.testing.assert_array_equal(np.array(list(tiff.pages)), arr)
+    tiff3d = lt.TIFF3D.open(filename)
+    np.testing.assert_array_equal(tiff3d.pages[2], arr[2])
+    assert tiff3d.CurrentDirectory().value == 2
+    tiff3d.close()
+
+    # all the pages are copied
+    tiff.copy(tmp_path / 'libtiff_test_pages_copy.tiff', compression='lzw')
+    tiff2 = lt.TIFF.open(tmp_path / 'libtiff_test_pages_copy.tiff')
+    np.testing.assert_array_equal(np.array(list(tiff2.iter_images())), arr)
+
+
+def test_levels(tmp_path):
+    filename = tmp_path / 'libtiff_test_levels.tiff'
+    arr = (np.arange(64 * 48) % 251).astype(np.uint8).reshape(64, 48)
+    tiff = lt.TIFF.open(filename, mode='w')
+    tiff.SetField('SubIFD', [0, 0])
+    tiff.write_image(arr)
+    # the next two directories are written as SubIFDs
+    tiff.write_image(arr[::2, ::2])
+    tiff.write_tiles(np.ascontiguousarray(arr[::4, ::4]), 16, 16)
+    tiff.write_image(arr + 1)
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    assert len(tiff.pages) == 2
+    assert [layout.shape for layout in tiff.levels()] == \
+        [(64, 48), (32, 24), (16, 12)]
+    np.testing.assert_array_equal(tiff.read_level(1), arr[::2, ::2])
+    np.testing.assert_array_equal(tiff.read_level(-1), arr[::4, ::4])
+    np.testing.assert_array_equal(tiff.read_level(2, region=(2, 3, 5, 6)),
+                                  arr[::4, ::4][3:9, 2:7])
+    assert tiff.CurrentDirectory().value == 0
+    with pytest.raises(IndexError):
+        tiff.read_level(3)
+    assert tiff.level_for_size(10, 10) == 2
+    assert tiff.level_for_size(20, 16) == 1
+    assert tiff.level_for_size(100, 100) == 0
+
+    tiff.ReadDirectory()
+    np.testing.assert_array_equal(tiff.read_image(), arr + 1)
+    assert len(tiff.levels()) == 1
+    tiff.close()
+
+
+def test_write_pyramid(tmp_path):
+    filename = tmp_path / 'libtiff_test_write_pyramid.tiff'
+    arr = (np.arange(100 * 70) % 251).astype(np.uint16).reshape(100, 70)
+    rgb = (np.arange(40 * 36 * 3) % 251).astype(np.uint8).reshape(40, 36, 3)
+    labels = np.repeat(np.repeat(np.arange(12).reshape(4, 3), 5, 0), 6, 1)
+    tiff = lt.TIFF.open(filename, mode='w')
+    tiff.write_pyramid(arr, tile_size=32, compression='lzw')
+    tiff.write_pyramid(lambda start, stop: rgb[start:stop], levels=1,
+                       tile_size=16, method='nearest', shape=rgb.shape,
+                       dtype=rgb.dtype)
+    tiff.write_pyramid(labels.astype(np.uint8), levels=2, tile_size=16,
+                       method='mode')
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    assert len(tiff.pages) == 3
+    assert [layout.shape for layout in tiff.levels()] == \
+        [(100, 70), (50, 35), (25, 18)]
+    np.testing.assert_array_equal(tiff.read_level(0), arr)
+    block = arr[:2, :2].astype(float)
+    assert tiff.read_level(1)[0, 0] == np.round(block.mean())
+    expected = arr.astype(float)
+    for _level in [1, 2]:
+        if expected.shape[1] % 2:
+            expected = np.concatenate([expected, expected[:, -1:]], 1)
+        expected = expected.reshape(
+            expected.shape[0] // 2, 2, expected.shape[1] // 2, 2).mean(
+                axis=(1, 3))
+    assert np.abs(tiff.read_level(2) - expected).max() <= 1
+
+    tiff.set_page(1)
+    np.testing.assert_array_equal(tiff.read_level(0), rgb)
+    np.testing.assert_array_equal(tiff.read_level(1), rgb[::2, ::2])
+
+    tiff.set_page(2)
+    assert [layout.shape for layout in tiff.levels()] == \
+        [(20, 18), (10, 9), (5, 5)]
+    np.testing.assert_array_equal(tiff.read_level(1), labels[::2, ::2])
+    tiff.close()
+
+    tiff = lt.TIFF.open(tmp_path / 'error.tiff', mode='w')
+    with pytest.raises(ValueError):
+        tiff.write_pyramid(arr, method='median')
+    with pytest.raises(ValueError):
+        tiff.write_pyramid(lambda start, stop: arr[start:stop])
+    tiff.close()
+
+
+def test_layout(tmp_path):
+    test_tile_write(tmp_path)  # Create file first
+
+    tiff = lt.TIFF.open(tmp_path / "libtiff_test_tile_write.tiff", "r")
+    tiff.SetDirectory(2)
+    layout = tiff.get_layout()
+    assert tiff.get_layout() is layout
+    assert (layout.width, layout.length, layout.depth) == (3000, 2500, 1)
+    assert (layout.tile_width, layout.tile_length) == (512, 528)
+    assert layout.tiled
+    assert layout.samples_per_pixel == 3
+    assert layout.bits_per_sample == 8
+    assert layout.planar_config == lt.PLANARCONFIG_CONTIG
+    assert layout.compression == lt.COMPRESSION_NONE
+    assert layout.dtype == np.uint8
+
+    for directory in range(5):
+        tiff.SetDirectory(directory)
+        assert tiff.get_layout() is not layout
+        layout = tiff.get_layout()
+        assert tiff.read_image().shape == layout.shape
+
+    tiff.SetDirectory(4)
+    assert tiff.get_layout() == layout
+    tiff.SetDirectory(0)
+    assert tiff.get_layout() != layout
+
+
+def test_get_all_tags(tmp_path):
+    filename = tmp_path / "libtiff_test_get_all_tags.tiff"
+    tiff = lt.TIFF.open(filename, mode="w")
+    arr = np.arange(40 * 30, dtype=np.uint16).reshape(40, 30)
+    tiff.SetField("Artist", b"A Name")
+    tiff.SetField("DocumentName", b"A Document")
+    tiff.SetField("XResolution", 72.0)
+    tiff.SetField("ResolutionUnit", lt.RESUNIT_INCH)
+    tiff.write_image(arr, compression="lzw")
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename, mode="r")
+    tags = tiff.get_all_tags()
+    # the keys are the names of the TIFFTAG_* constants
+    assert all(name == name.upper() for name in tags)
+    for name in ["IMAGEWIDTH", "IMAGELENGTH", "BITSPERSAMPLE", "COMPRESSION",
+                 "ARTIST", "DOCUMENTNAME", "XRESOLUTION", "RESOLUTIONUNIT"]:
+        assert tags[name] == tiff.GetField(name)
+    assert tags["ARTIST"] == b"A Name"
+    assert tags["IMAGEWIDTH"] == 30
+    assert "STRIPOFFSETS" in tags
+    assert "TILEOFFSETS" not in tags
+    assert "COPYRIGHT" not in tags
+    tiff.close()
+
+    # the keys and values are accepted by SetField
+    filename = tmp_path / "libtiff_test_get_all_tags_rgb.tiff"
+    tiff = lt.TIFF.open(filename, mode="w")
+    tiff.SetField("BitsPerSample", 8)
+    tiff.SetField("SamplesPerPixel", 3)
+    tiff.SetField("ReferenceBlackWhite", [0, 255, 128, 255, 128, 255])
+    tiff.SetField("YCbCrSubsampling", (2, 1))
+    tiff.SetField("HalftoneHints", (10, 200))
+    tiff.SetField("TransferFunction", [np.arange(256, dtype=np.uint16)] * 3)
+    tiff.write_image(np.zeros((20, 10, 3), np.uint8), write_rgb=True)
+    tiff.close()
+    tiff = lt.TIFF.open(filename, mode="r")
+    tags = tiff.get_all_tags()
+    assert tags["REFERENCEBLACKWHITE"] == [0, 255, 128, 255, 128, 255]
+    assert tags["YCBCRSUBSAMPLING"] == (2, 1)
+    assert tags["HALFTONEHINTS"] == (10, 200)
+    assert len(tags["TRANSFERFUNCTION"]) == 3
+    assert np.array_equal(tags["TRANSFERFUNCTION"][2], np.arange(256))
+    assert tags["PHOTOMETRIC"] == lt.PHOTOMETRIC_RGB
+    assert tags["PLANARCONFIG"] == lt.PLANARCONFIG_CONTIG
+    copy = lt.TIFF.open(tmp_path / "libtiff_test_set_all_tags.tiff", "w")
+    for name, value in tags.items():
+        copy.SetField(name, value)
+    for name, value in tags.items():
+        if name in ("STRIPOFFSETS", "STRIPBYTECOUNTS"):
+            continue
+        assert np.array_equal(np.asarray(copy.GetField(name), dtype=object),
+                              np.asarray(value, dtype=object)), name
+    copy.close()
+    tiff.close()
+
+    test_tile_write(tmp_path)
+    tiff = lt.TIFF.open(tmp_path / "libtiff_test_tile_write.tiff", "r")
+    tags = tiff.get_all_tags()
+    assert tags["TILEWIDTH"] == 512
+    assert "TILEOFFSETS" in tags
+    assert "STRIPOFFSETS" not in tags
+    tiff.close()
+
+
+def test_array_tags(tmp_path):
+    filename = tmp_path / "libtiff_test_array_tags.tiff"
+    tiff = lt.TIFF.open(filename, mode="w")
+    arr = np.arange(100 * 40, dtype=np.uint16).reshape(100, 40)
+    colormap = np.arange(3 << 16, dtype=np.uint32).astype(np.uint16)
+    colormap = colormap.reshape(3, 1 << 16)
+    tiff.SetField("BitsPerSample", 16)
+    tiff.SetField("ColorMap", colormap)
+    _write_strips(tiff, arr, 30)
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename, mode="r")
+    offsets = tiff.GetField("StripOffsets")
+    bytecounts = tiff.GetField("StripByteCounts")
+    assert isinstance(offsets, np.ndarray)
+    assert offsets.shape == bytecounts.shape == (tiff.NumberOfStrips(),)
+    assert not offsets.flags.writeable
+    assert np.all(offsets[1:] >= offsets[:-1] + bytecounts[:-1])
+    red, green, blue = tiff.GetField("ColorMap")
+    np.testing.assert_array_equal(red, colormap[0])
+    np.testing.assert_array_equal(blue, colormap[2])
+    tiff.close()
+
+    test_tile_write(tmp_path)
+    tiff = lt.TIFF.open(tmp_path / "libtiff_test_tile_write.tiff", "r")
+    tiff.SetDirectory(3)
+    assert tiff.GetField("TileOffsets").shape == (tiff.NumberOfTiles(),)
+    assert np.all(tiff.GetField("TileByteCounts") == 512 * 528)
+    tiff.close()
+
+
 def test_tiled_image_read(tmp_path):
     """
     Tests opening a tiled image
@@ -606,6 +1528,127 @@ def test_copy(tmp_path):
     print('test copy ok')
 
 
+def test_copy_raw(tmp_path, monkeypatch):
+    filename = tmp_path / 'libtiff_test_copy_raw.tiff'
+    arr = (np.arange(50 * 32) % 251).astype(np.uint16).reshape(50, 32)
+    tiff = lt.TIFF.open(filename, mode='w')
+    _write_strips(tiff, arr, 7)
+    tiff.write_tiles(arr, 16, 16, compression='lzw')
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    raw = []
+    for page in range(2):
+        tiff.set_page(page)
+        raw.append([bytes(data) for _, data in tiff.iter_raw_chunks()])
+
+    # only the description changes: the chunks are not decoded
+    def fail(*args):
+        raise AssertionError('chunk decoded')
+    monkeypatch.setattr(lt.TIFF, 'ReadEncodedStrip', fail)
+    copy_name = tmp_path / 'libtiff_test_copy_raw2.tiff'
+    tiff.copy(copy_name, imagedescription=b'retagged')
+    monkeypatch.undo()
+    tiff.close()
+
+    copy = lt.TIFF.open(copy_name)
+    for page in range(2):
+        copy.set_page(page)
+        assert copy.GetField('ImageDescription') == b'retagged'
+        assert [bytes(data) for _, data in copy.iter_raw_chunks()] == \
+            raw[page]
+        np.testing.assert_array_equal(copy.read_image(), arr)
+    copy.close()
+
+
+def test_copy_retile(tmp_path, monkeypatch):
+    filename = tmp_path / 'libtiff_test_copy_retile.tiff'
+    gray = (np.arange(70 * 45) % 251).astype(np.uint16).reshape(70, 45)
+    rgb = (np.arange(70 * 45 * 3) % 251).astype(np.uint8).reshape(70, 45, 3)
+    tiff = lt.TIFF.open(filename, mode='w')
+    _write_strips(tiff, gray, 7)
+    tiff.write_tiles(gray, 32, 16, compression='lzw')
+    _write_strips(tiff, rgb, 9)
+    _write_strips(tiff, rgb.transpose(2, 0, 1), 20,
+                  planar_config=lt.PLANARCONFIG_SEPARATE)
+    tiff.close()
+    expected = [gray, gray, rgb, rgb.transpose(2, 0, 1)]
+
+    # the input is decoded one chunk height at a time, once
+    bands = []
+    read_region = lt.TIFF.read_region
+
+    def record_region(self, x, y, width, height):
+        bands.append((self.CurrentDirOffset(), self.get_layout(), y, height))
+        return read_region(self, x, y, width, height)
+
+    monkeypatch.setattr(lt.TIFF, 'read_region', record_region)
+
+    tiff = lt.TIFF.open(filename)
+    for kws in [dict(tile_size=16), dict(tile_size=(48, 32)),
+                dict(rows_per_strip=5), dict(rows_per_strip=100),
+                dict(tile_size=16, compression='deflate')]:
+        copy_name = tmp_path / 'libtiff_test_copy_retile2.tiff'
+        del bands[:]
+        tiff.copy(copy_name, **kws)
+        for _offset, layout, y, height in bands:
+            in_rows = (layout.tile_length if layout.tiled
+                       else layout.rows_per_strip)
+            assert y % in_rows == 0 and height <= in_rows
+        assert len(set((offset, y) for offset, _, y, _ in bands)) == \
+            len(bands)
+        copy = lt.TIFF.open(copy_name)
+        for page, arr in enumerate(expected):
+            copy.set_page(page)
+            layout = copy.get_layout()
+            if 'tile_size' in kws:
+                assert layout.tiled
+                assert layout.tile_width == np.atleast_1d(kws['tile_size'])[0]
+            else:
+                assert not layout.tiled
+                assert layout.rows_per_strip == kws['rows_per_strip']
+            np.testing.assert_array_equal(copy.read_image(), arr)
+        copy.close()
+
+    # the strips and tiles are kept by default
+    tiff.copy(tmp_path / 'libtiff_test_copy_retile3.tiff')
+    copy = lt.TIFF.open(tmp_path / 'libtiff_test_copy_retile3.tiff')
+    copy.set_page(1)
+    assert copy.get_layout().tile_length == 16
+    np.testing.assert_array_equal(copy.read_image(), gray)
+    copy.close()
+    with pytest.raises(ValueError):
+        tiff.copy(tmp_path / 'error.tiff', tile_size=16, rows_per_strip=5)
+    tiff.close()
+
+
+def test_copy_pyramid(tmp_path):
+    filename = tmp_path / 'libtiff_test_copy_pyramid.tiff'
+    arr = (np.arange(100 * 70) % 251).astype(np.uint16).reshape(100, 70)
+    tiff = lt.TIFF.open(filename, mode='w')
+    tiff.write_pyramid(arr, levels=2, tile_size=32, compression='lzw')
+    tiff.write_image(arr[:10])
+    tiff.close()
+
+    tiff = lt.TIFF.open(filename)
+    for kws in [{}, dict(tile_size=16)]:
+        copy_name = tmp_path / 'libtiff_test_copy_pyramid2.tiff'
+        tiff.copy(copy_name, **kws)
+        tiff.set_page(0)
+        copy = lt.TIFF.open(copy_name)
+        assert len(copy.pages) == 2
+        assert [layout.shape for layout in copy.levels()] == \
+            [(100, 70), (50, 35), (25, 18)]
+        for level in range(3):
+            np.testing.assert_array_equal(copy.read_level(level),
+                                          tiff.read_level(level))
+        copy.set_page(1)
+        assert len(copy.levels()) == 1
+        np.testing.assert_array_equal(copy.read_image(), arr[:10])
+        copy.close()
+    tiff.close()
+
+
 # The TAG_TEST_DATA_BASE dictionary is used to test setting and getting TIFF
 # tags.
 TAG_TEST_DATA_BASE = {